@@ -224,6 +224,19 @@ class Logger(object):
         '''
         return self._level.value >= level.value
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def is_enabled_for(self, level):
+        '''
+        Returns True if a message of the provided level would be logged,
+        i.e., this logger is not suppressed and its level is less than or
+        equal to the argument. Use this to avoid formatting a message that
+        would otherwise be discarded, e.g.,
+
+            if self._log.is_enabled_for(Level.DEBUG):
+                self._log.debug('value: {}'.format(_expensive()))
+        '''
+        return not self.suppressed and self._level.value <= level.value
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     @property
     def stats(self):
@@ -28,6 +28,8 @@ from core.direction import Direction
 class Message(object):
 
     ID_CHARACTERS = string.ascii_uppercase + string.digits
+    __slots__ = ( '_payload', '_timestamp', '_message_id', '_instance_name', '_sent',
+                  '_expired', '_gc', '_processors', '_subscribers' )
 
     '''
     IMPORTANT: Don't create one of these directly: use the MessageFactory class.
@@ -281,6 +283,8 @@ class Payload(object):
     floats. 
 
     '''
+    __slots__ = ( '_event', '_value' )
+
     def __init__(self, event, value):
         self._event = event
         self._value = value
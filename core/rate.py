@@ -91,6 +91,16 @@ class Rate():
         '''
         return round(self._dt_s * 1000)
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def reset(self):
+        '''
+        Restarts the current period from now, so that a Rate may be reused
+        for a new loop without its first wait() being measured from the end
+        of the previous one.
+        '''
+        self._last_ns   = time.perf_counter_ns()
+        self._last_time = time.perf_counter()
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def waiting(self):
         '''
@@ -105,6 +115,12 @@ class Rate():
         so that the loop is no faster than the specified frequency. If
         called after the allotted period has passed, no waiting takes place.
 
+        Each period is scheduled from the end of the previous period rather
+        than from when the previous wait() returned, so that oversleeping
+        or a variable amount of work in the loop doesn't accumulate as
+        drift. If the loop overruns a period the schedule restarts from
+        now, rather than running a burst of short loops to catch up.
+
         E.g.:
 
             # execute loop at 60Hz
@@ -115,21 +131,25 @@ class Rate():
                 rate.wait()
         '''
         if self._use_ns:
-            _ns_diff = time.perf_counter_ns() - self._last_ns
-            _delay_sec = ( self._dt_ns - _ns_diff ) / ( 1000 * 1000000 )
+            _now_ns = time.perf_counter_ns()
+            _ns_diff = _now_ns - self._last_ns
             if self._dt_ns > _ns_diff:
-                time.sleep(_delay_sec)
-            self._last_ns = time.perf_counter_ns()
+                time.sleep(( self._dt_ns - _ns_diff ) / ( 1000 * 1000000 ))
+                self._last_ns += self._dt_ns
+            else:
+                self._last_ns = _now_ns
         else:
-            _diff = time.perf_counter() - self._last_time
+            _now = time.perf_counter()
+            _diff = _now - self._last_time
             _delay_sec = self._dt_s - _diff
             # adjust for error
             if _delay_sec + self._trim > 0.0:
                 _delay_sec += self._trim
             if self._dt_s > _diff:
                 time.sleep(_delay_sec)
+                self._last_time += self._dt_s
             else:
                 self._log.debug('no additional delay in rate loop (diff: {:7.4f}ms)'.format(_diff * 1000.0))
-            self._last_time = time.perf_counter()
+                self._last_time = _now
 
 #EOF
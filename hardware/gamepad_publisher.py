@@ -13,12 +13,15 @@
 # a paired Bluetooth device.
 #
 
-import itertools, traceback
+import os, itertools, traceback
 from threading import Timer
 import time # only used for gamepad connection
 import asyncio
-from colorama import init, Fore, Style
-init()
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+from colorama import Fore, Style
 
 from core.logger import Logger, Level
 from core.event import Event
@@ -30,18 +33,85 @@ from hardware.gamepad_monitor import GamepadMonitor
 from hardware.player import Player
 from hardware.sound import Sound
 
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+#        1         2         3         4         5         6         7         8         9         C         1         2
+#23456789012345678901234567890123456789012345678901234567890123456789012345678901234567890123456789012345678901234567890
+_KEYMAP_BANNER = '''button map:
+
+     ┏━━━━━━━━┳━━━━━━┓                                             ┏━━━━━━┳━━━━━━━━┓
+     ┃    L1  ┃  L2  ┃                                             ┃  R2  ┃  R1    ┃
+     ┃   ┏━━━━┻━━━━━━┻━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┻━━━━━━┻━━━━┓   ┃
+     ┃   ┃                                                     ┏━━━━━┓         ┃   ┃
+     ┃   ┃        ┏━━━━━┓                                      ┃  X  ┃         ┃   ┃
+     ┗━━━┫        ┃  U  ┃                                      ┗━━━━━┛         ┣━━━┛
+         ┃   ┏━━━━┛     ┗━━━━┓     ┏━━━━━┓    ┏━━━━━┓     ┏━━━━━┓   ┏━━━━━┓    ┃
+         ┃   ┃ L           R ┃     ┃ SEL ┃    ┃ STR ┃     ┃  Y  ┃   ┃  A  ┃    ┃
+         ┃   ┗━━━━┓     ┏━━━━┛     ┗━━━━━┛    ┗━━━━━┛     ┗━━━━━┛   ┗━━━━━┛    ┃
+         ┃        ┃  D  ┃                                      ┏━━━━━┓         ┃
+         ┃        ┗━━━━━┛                                      ┃  B  ┃         ┃
+         ┃                   ┏━━━━━━━━┓          ┏━━━━━━━━┓    ┗━━━━━┛         ┃
+         ┃                   ┃        ┃          ┃        ┃                    ┃
+         ┃                   ┃   JL   ┃          ┃   JR   ┃                    ┃
+         ┃                   ┃        ┃          ┃        ┃                    ┃
+         ┃                   ┗━━━━━━━━┛          ┗━━━━━━━━┛                    ┃
+         ┃                                                                     ┃
+         ┗━━━━━━━━━┻━━━━━━━━━┻━━┳━━━━━━┻━┳━━━━━┳━┻━━━━━━┳━━┻━━━━━━━━━┻━━━━━━━━━┛
+                                ┃   B1   ┃  P  ┃   B2   ┃
+                                ┗━━━━━━━━┻━━━━━┻━━━━━━━━┛
+     L1: video                                                                 R1: lights on
+     L2: unassigned                                                            R2: lights off
+     U:  velocity                  SEL: standby                                X:  roam
+     L:  theta                     STR: no action                              Y:  brake
+     R:  theta                                                                 A:  avoid
+     D:  velocity                                                              B:  stop
+
+                    JL: velocity port                JR: velocity starbard
+                                   B1: description
+                                   P:  description
+                                   B2: description
+        '''
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+# bright color prefixes used by _print_event()
+_BRIGHT_PREFIX = { _color: _color + Style.BRIGHT for _color in (
+        Fore.BLACK, Fore.RED, Fore.GREEN, Fore.YELLOW, Fore.BLUE, Fore.MAGENTA, Fore.CYAN, Fore.WHITE ) }
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+# maps character ordinals to Events, used by get_event_for_char()
+_CHAR_EVENT_MAP = {
+    44:  Event.DECREASE_VELOCITY, # ,
+    46:  Event.INCREASE_VELOCITY, # .
+    98:  Event.BRAKE,             # b
+    100: Event.INFRARED_CNTR,     # d
+    101: Event.SNIFF,             # e
+    102: Event.INFRARED_STBD,     # f
+    106: Event.BUMPER_PORT,       # j
+    107: Event.BUMPER_CNTR,       # k
+    108: Event.BUMPER_STBD,       # l
+    109: Event.STOP,              # m
+    110: Event.HALT,              # n
+    114: Event.ROAM,              # r
+    115: Event.INFRARED_PORT,     # s
+    116: Event.NOOP,              # t
+    127: Event.SHUTDOWN           # del
+}
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 class GamepadPublisher(Publisher):
     _PUBLISH_LOOP_NAME = '__gamepad_publish_loop'
+    _AXIS_EVENTS = { Event.L3_VERTICAL, Event.L3_HORIZONTAL, Event.R3_VERTICAL, Event.R3_HORIZONTAL }
     '''
     A Publisher that connects with a bluetooth-based gamepad.
     '''
     def __init__(self, config, message_bus, message_factory, exit_on_complete=True, level=Level.INFO):
         Publisher.__init__(self, 'gamepad', config, message_bus, message_factory, suppressed=False, level=level)
         self._level             = level
-        self._play_sound        = self._config['mros'].get('play_sound')
-        _cfg = self._config['mros'].get('publisher').get('gamepad')
+        self._play_sound        = self._config['mros']['play_sound']
+        _cfg = self._config['mros']['publisher']['gamepad']
         self._publish_delay_sec = _cfg.get('publish_delay_sec')
+        self._connect_timeout_sec = _cfg.get('connect_timeout_sec')
+        self._axis_deadband     = _cfg.get('axis_deadband')
+        self._last_axis_value   = {} # last published value for each joystick axis Event
         self._gamepad           = None
         self._monitor           = None
         self._log.info('ready.')
@@ -70,19 +140,14 @@ class GamepadPublisher(Publisher):
             try:
                 # attempt connection ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
                 self._gamepad.enable()
-                _count = 0
-                while not self._gamepad.has_connection():
-                    _count += 1
-                    if _count == 1:
-                        self._log.info('connecting to gamepad…')
-                    else:
-                        self._log.warning('gamepad not connected; re-trying… [{:d}]'.format(_count))
-                    self._gamepad.connect()
-                    time.sleep(0.5)
-                    if self._gamepad.has_connection() or _count > 5:
-                        if self._play_sound:
-                            Player.instance().play(Sound.MARTINI)
-                        break
+                if not self._gamepad.has_connection():
+                    self._log.info('connecting to gamepad…')
+                    self._wait_for_gamepad()
+                    if not self._gamepad.has_connection():
+                        # handled below: clears the gamepad so the monitor reports no connection
+                        raise ConnectionError('no gamepad connected within {}s.'.format(self._connect_timeout_sec))
+                if self._play_sound:
+                    Player.instance().play(Sound.MARTINI)
             except ConnectionError as e:
                 self._log.warning('unable to connect to gamepad: {}'.format(e))
                 self._gamepad = None
@@ -111,6 +176,39 @@ class GamepadPublisher(Publisher):
                     self._log.info('disabled: no gamepad.')
                 self._monitor.enable()
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _wait_for_gamepad(self):
+        '''
+        Waits up to the configured timeout for the gamepad device node to
+        appear, attempting a connection whenever the kernel creates or
+        changes a node in its directory. If inotify_simple is not installed
+        this falls back to retrying at a fixed interval.
+        '''
+        _deadline = time.monotonic() + self._connect_timeout_sec
+        if INotify is None:
+            self._log.warning('inotify_simple not available: polling for gamepad device.')
+            while not self._gamepad.has_connection() and time.monotonic() < _deadline:
+                time.sleep(0.5)
+                self._try_connect()
+            return
+        with INotify() as _inotify:
+            _inotify.add_watch(os.path.dirname(self._gamepad.device_path), flags.CREATE | flags.ATTRIB)
+            self._try_connect() # in case the device appeared before the watch was added
+            while not self._gamepad.has_connection():
+                _remaining_ms = int(( _deadline - time.monotonic() ) * 1000)
+                if _remaining_ms <= 0 or not _inotify.read(timeout=_remaining_ms):
+                    self._log.warning('timed out waiting for gamepad device.')
+                    break
+                self._try_connect()
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _try_connect(self):
+        if self._gamepad.device_exists():
+            try:
+                self._gamepad.connect()
+            except ConnectionError as e:
+                self._log.warning('gamepad not connected; waiting… ({})'.format(e))
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _disappearance_callback(self):
         self._log.warning('gamepad has disappeared.')
@@ -150,6 +248,14 @@ class GamepadPublisher(Publisher):
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     async def __gamepad_publish_loop(self, message):
+        _event = message.event
+        if _event in GamepadPublisher._AXIS_EVENTS:
+            # suppress repeated or jittering joystick values
+            _value = message.value
+            _last_value = self._last_axis_value.get(_event)
+            if _last_value is not None and abs(_value - _last_value) < self._axis_deadband:
+                return
+            self._last_axis_value[_event] = _value
         await Publisher.publish(self, message)
         await asyncio.sleep(self._publish_delay_sec)
 
@@ -169,123 +275,53 @@ class GamepadPublisher(Publisher):
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _print_event(self, color, event, value):
-        self._log.info('event:\t' + color + Style.BRIGHT + '{}; value: {}'.format(event.name, value))
+        self._log.info('event:\t{}{}; value: {}'.format(_BRIGHT_PREFIX.get(color) or color + Style.BRIGHT, event.name, value))
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def print_keymap(self):
-#        1         2         3         4         5         6         7         8         9         C         1         2
-#23456789012345678901234567890123456789012345678901234567890123456789012345678901234567890123456789012345678901234567890
-        self._log.info('''button map:
+        self._log.info(_KEYMAP_BANNER)
 
-     ┏━━━━━━━━┳━━━━━━┓                                             ┏━━━━━━┳━━━━━━━━┓
-     ┃    L1  ┃  L2  ┃                                             ┃  R2  ┃  R1    ┃
-     ┃   ┏━━━━┻━━━━━━┻━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┻━━━━━━┻━━━━┓   ┃
-     ┃   ┃                                                     ┏━━━━━┓         ┃   ┃
-     ┃   ┃        ┏━━━━━┓                                      ┃  X  ┃         ┃   ┃
-     ┗━━━┫        ┃  U  ┃                                      ┗━━━━━┛         ┣━━━┛
-         ┃   ┏━━━━┛     ┗━━━━┓     ┏━━━━━┓    ┏━━━━━┓     ┏━━━━━┓   ┏━━━━━┓    ┃
-         ┃   ┃ L           R ┃     ┃ SEL ┃    ┃ STR ┃     ┃  Y  ┃   ┃  A  ┃    ┃
-         ┃   ┗━━━━┓     ┏━━━━┛     ┗━━━━━┛    ┗━━━━━┛     ┗━━━━━┛   ┗━━━━━┛    ┃
-         ┃        ┃  D  ┃                                      ┏━━━━━┓         ┃
-         ┃        ┗━━━━━┛                                      ┃  B  ┃         ┃
-         ┃                   ┏━━━━━━━━┓          ┏━━━━━━━━┓    ┗━━━━━┛         ┃
-         ┃                   ┃        ┃          ┃        ┃                    ┃
-         ┃                   ┃   JL   ┃          ┃   JR   ┃                    ┃
-         ┃                   ┃        ┃          ┃        ┃                    ┃
-         ┃                   ┗━━━━━━━━┛          ┗━━━━━━━━┛                    ┃
-         ┃                                                                     ┃
-         ┗━━━━━━━━━┻━━━━━━━━━┻━━┳━━━━━━┻━┳━━━━━┳━┻━━━━━━┳━━┻━━━━━━━━━┻━━━━━━━━━┛
-                                ┃   B1   ┃  P  ┃   B2   ┃
-                                ┗━━━━━━━━┻━━━━━┻━━━━━━━━┛
-     L1: video                                                                 R1: lights on
-     L2: unassigned                                                            R2: lights off
-     U:  velocity                  SEL: standby                                X:  roam
-     L:  theta                     STR: no action                              Y:  brake
-     R:  theta                                                                 A:  avoid
-     D:  velocity                                                              B:  stop
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def get_event_for_char(self, och):
+        '''
+        Below are the mapped characters for IFS-based events, including several others:
 
-                    JL: velocity port                JR: velocity starbard
-                                   B1: description
-                                   P:  description
-                                   B2: description
-        ''')
+           oct   dec   hex   char   usage
 
-#    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-#    def get_event_for_char(self, och):
-#        '''
-#        Below are the mapped characters for IFS-based events, including several others:
-#
-#           oct   dec   hex   char   usage
-#
-#            54   44    2C    , *    increase motors speed (both)
-#            56   46    2E    . *    decrease motors speed (both)
-#
-#           141   97    61    a *    port side IR
-#           142   98    62    b *    brake
-#           143   99    63    c
-#           144   100   64    d *    cntr IR
-#           145   101   65    e *    sniff
-#           146   102   66    f *    stbd IR
-#           147   103   67    g *    stbd side IR
-#           150   104   68    h
-#           151   105   69    i      info
-#           152   106   6A    j *    port BMP
-#           153   107   6B    k *    cntr BMP
-#           154   108   6C    l *    stbd BMP
-#           155   109   6D    m *    stop
-#           156   110   6E    n *    halt
-#           157   111   6F    o      clear task list
-#           160   112   70    p      pop message
-#           161   113   71    q
-#           162   114   72    r      roam
-#           163   115   73    s *    port IR
-#           164   116   74    t      noop (test message)
-#           165   117   75    u
-#           166   118   76    v      verbose
-#           167   119   77    w      toggle flood mode with random messages
-#           170   120   78    x
-#           171   121   79    y
-#           172   122   7A    z
-#           177   127   7f   del     shut down
-#
-#        * represents robot sensor or control input.
-#        '''
-#
-#        if och   == 44:  # ,
-#            return Event.DECREASE_VELOCITY
-#        elif och == 46:  # .
-#            return Event.INCREASE_VELOCITY
-#        elif och == 97:  # a
-#            return Event.INFRARED_PSID
-#        elif och == 98:  # b
-#            return Event.BRAKE
-#        elif och == 100: # d
-#            return Event.INFRARED_CNTR
-#        elif och == 101: # e
-#            return Event.SNIFF
-#        elif och == 102: # f
-#            return Event.INFRARED_STBD
-#        elif och == 103: # g
-#            return Event.INFRARED_SSID
-#        elif och == 106: # j
-#            return Event.BUMPER_PORT
-#        elif och == 107: # k
-#            return Event.BUMPER_CNTR
-#        elif och == 108: # l
-#            return Event.BUMPER_STBD
-#        elif och == 109: # m
-#            return Event.STOP
-#        elif och == 110: # h
-#            return Event.HALT
-#        elif och == 114: # r
-#            return Event.ROAM
-#        elif och == 115: # s
-#            return Event.INFRARED_PORT
-#        elif och == 116: # s
-#            return Event.NOOP
-#        elif och == 127: # del
-#            return Event.SHUTDOWN
-#        else:
-#            return None
+            54   44    2C    , *    increase motors speed (both)
+            56   46    2E    . *    decrease motors speed (both)
+
+           141   97    61    a *    port side IR
+           142   98    62    b *    brake
+           143   99    63    c
+           144   100   64    d *    cntr IR
+           145   101   65    e *    sniff
+           146   102   66    f *    stbd IR
+           147   103   67    g *    stbd side IR
+           150   104   68    h
+           151   105   69    i      info
+           152   106   6A    j *    port BMP
+           153   107   6B    k *    cntr BMP
+           154   108   6C    l *    stbd BMP
+           155   109   6D    m *    stop
+           156   110   6E    n *    halt
+           157   111   6F    o      clear task list
+           160   112   70    p      pop message
+           161   113   71    q
+           162   114   72    r      roam
+           163   115   73    s *    port IR
+           164   116   74    t      noop (test message)
+           165   117   75    u
+           166   118   76    v      verbose
+           167   119   77    w      toggle flood mode with random messages
+           170   120   78    x
+           171   121   79    y
+           172   122   7A    z
+           177   127   7f   del     shut down
+
+        * represents robot sensor or control input. The port and starboard side
+        IRs ('a' and 'g') currently have no corresponding Event and return None.
+        '''
+        return _CHAR_EVENT_MAP.get(och)
 
 #EOF
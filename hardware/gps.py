@@ -10,7 +10,10 @@
 # modified: 2024-06-11
 #
 
-import traceback
+import os, fcntl, json, time, traceback
+from collections import deque
+from operator import itemgetter
+from threading import Thread
 
 from colorama import init, Fore, Style
 init()
@@ -19,8 +22,152 @@ from pa1010d import PA1010D
 
 from core.logger import Logger, Level
 
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class FilteredPA1010D(PA1010D):
+    '''
+    A PA1010D that reads from the device in 32 byte I²C block reads rather
+    than one transaction per byte, and discards NMEA sentences GPS doesn't
+    use before they are handed to pynmea2, checking only the three-character
+    sentence type rather than running each through the pynmea2 sentence
+    regex. Proprietary ($PMTK) sentences are always passed through.
+    '''
+    # no __slots__ here: PA1010D.data builds its dict from self.__slots__
+    SENTENCE_TYPES = frozenset(( 'GGA', 'GSA', 'RMC' ))
+    BLOCK_SIZE     = 32     # the SMBus block read limit
+    I2C_RETRIES    = 0x0701 # i2c-dev ioctl: number of retries on a NAK
+    I2C_TIMEOUT    = 0x0702 # i2c-dev ioctl: adapter timeout in units of 10ms
+
+    def __init__(self):
+        PA1010D.__init__(self)
+        self._buffer = bytearray()
+
+    def set_bus_limits(self, timeout_ms, retries):
+        '''
+        Bounds the worst-case duration of an I²C transaction by setting the
+        bus adapter's timeout and retry count. Note that these are properties
+        of the adapter (bus 1, as used by PA1010D), so apply to every device
+        on the bus, and persist until changed or the system is rebooted.
+        '''
+        _fd = os.open('/dev/i2c-1', os.O_RDWR)
+        try:
+            fcntl.ioctl(_fd, FilteredPA1010D.I2C_TIMEOUT, max(1, timeout_ms // 10))
+            fcntl.ioctl(_fd, FilteredPA1010D.I2C_RETRIES, retries)
+        finally:
+            os.close(_fd)
+
+    @staticmethod
+    def checksum(payload):
+        '''
+        Returns the NMEA checksum of the payload (the bytes between the '$'
+        and '*' delimiters), the XOR of all its bytes.
+        '''
+        _checksum = 0
+        for _byte in payload:
+            _checksum ^= _byte
+        return _checksum
+
+    def send_command(self, command, add_checksum=True):
+        '''
+        Sends a command string to the PA1010D, as per PA1010D.send_command()
+        but computing the checksum with checksum().
+        '''
+        if not isinstance(command, bytes):
+            command = command.encode('ascii')
+        command = command.lstrip(b'$').rstrip(b'*')
+        _buf = bytearray(b'$')
+        _buf += command
+        if add_checksum:
+            _buf += '*{:02X}'.format(FilteredPA1010D.checksum(command)).encode('ascii')
+        _buf += b'\r\n'
+        self._write_sentence(_buf)
+
+    def read_sentence(self, timeout=5):
+        _deadline = time.time() + timeout
+        while True:
+            _sentence = self._read_raw_sentence(_deadline)
+            if _sentence[3:6] in FilteredPA1010D.SENTENCE_TYPES or _sentence.startswith('$P'):
+                return _sentence
+
+    def _read_raw_sentence(self, deadline):
+        '''
+        Returns the next complete sentence, buffering any bytes read beyond
+        its end. When idle the device returns newline (0x0A) filler bytes.
+        '''
+        _buffer = self._buffer
+        while True:
+            _start = _buffer.find(b'$')
+            if _start < 0:
+                _buffer.clear()
+            else:
+                _end = _buffer.find(b'\r\n', _start)
+                if _end >= 0:
+                    _sentence = _buffer[_start:_end].decode('ascii', errors='replace').replace('\n', '')
+                    del _buffer[:_end + 2]
+                    return _sentence
+                del _buffer[:_start]
+            if time.time() >= deadline:
+                raise TimeoutError('Timeout waiting for readline')
+            _buffer += bytes(self._i2c.read_i2c_block_data(self._i2c_addr, 0x00, FilteredPA1010D.BLOCK_SIZE))
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class GPSSnapshot(object):
+    '''
+    The values of a single GPS fix. A new snapshot is created for each fix
+    rather than modifying an existing one, so a reference obtained from
+    GPS.snapshot is always internally consistent.
+    '''
+    __slots__ = ( 'timestamp', 'latitude', 'longitude', 'lat_dir', 'lon_dir', 'altitude',
+                  'geo_sep', 'num_sats', 'gps_qual', 'speed', 'pdop', 'hdop', 'vdop' )
+
+    def __init__(self, timestamp=None, latitude=None, longitude=None, lat_dir=None, lon_dir=None, altitude=None,
+            geo_sep=None, num_sats=0, gps_qual=None, speed=0.0, pdop=0, hdop=0, vdop=0):
+        self.timestamp = timestamp
+        self.latitude  = latitude
+        self.longitude = longitude
+        self.lat_dir   = lat_dir
+        self.lon_dir   = lon_dir
+        self.altitude  = altitude
+        self.geo_sep   = geo_sep
+        self.num_sats  = num_sats
+        self.gps_qual  = gps_qual
+        self.speed     = speed
+        self.pdop      = pdop
+        self.hdop      = hdop
+        self.vdop      = vdop
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 class GPS(object):
+    # PMTK314 output frequencies for GLL,RMC,VTG,GGA,GSA,GSV and the reserved/MCHN fields
+    _SENTENCE_FILTER = 'PMTK314,0,1,0,1,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0'
+    _I2C_TIMEOUT_MS  = 100 # bounds a stalled I²C transaction (the kernel default is 1s)
+    _I2C_RETRIES     = 1
+    _HISTORY_SIZE    = 64  # the number of recent fixes retained
+    _MIN_BACKOFF_SEC = 0.05 # the initial pause following an I²C error, doubling on each successive error
+    _MAX_BACKOFF_SEC = 1.0
+    # extracts the fix fields from PA1010D.data in a single call
+    _FIX_FIELDS = itemgetter('timestamp', 'num_sats', 'latitude', 'longitude', 'lat_dir', 'lon_dir', 'altitude',
+            'geo_sep', 'gps_qual', 'speed_over_ground', 'pdop', 'hdop', 'vdop')
+    # the verbose fix report, dimmed unless more than one satellite is in use
+    _REPORT = '''
+        Timestamp:   %(timestamp)s
+        Latitude:    %(latitude)6.4f
+        Longitude:   %(longitude)6.4f
+        Lat Dir:     %(lat_dir)s
+        Long Dir:    %(lon_dir)s
+        Altitude:    %(altitude)s
+        Geo Sep:     %(geo_sep)s
+        Satellites:  %(num_sats)s
+        Quality:     %(gps_qual)s
+        Speed:       %(speed_over_ground)s
+        Fix Type:    %(mode_fix_type)s
+        PDOP:        %(pdop)s
+        VDOP:        %(vdop)s
+        HDOP:        %(hdop)s'''
+    _REPORT_DIM    = Style.DIM + _REPORT
+    _REPORT_NORMAL = Style.NORMAL + _REPORT
+    # canonical direction strings, so each fix doesn't hold its own copies
+    _DIRECTIONS = { 'N': 'N', 'S': 'S', 'E': 'E', 'W': 'W' }
+
     def __init__(self, level):
         '''
         Wraps a PA1010D GPS sensor in a class. A typical output is:
@@ -59,33 +206,100 @@ class GPS(object):
                                      discarded.
         '''
         self._log  = Logger('gps', level)
-        self._gps  = PA1010D()
+        self._gps  = FilteredPA1010D()
+        try:
+            self._gps.set_bus_limits(GPS._I2C_TIMEOUT_MS, GPS._I2C_RETRIES)
+        except OSError as ose:
+            self._log.warning('unable to set I²C bus limits: {}'.format(ose))
         try:
             self._gps.update()
+            # only output the sentences we use: RMC, GGA and GSA
+            self._gps.send_command(GPS._SENTENCE_FILTER)
             self._enabled = True
         except OSError as ose:
             self._log.error('disabled: error encountered: {}'.format(ose))
             self._enabled = False
-        self._data      = None
-        self._timestamp = None
-        self._latitude  = None
-        self._longitude = None
-        self._lat_dir   = None
-        self._lon_dir   = None
-        self._altitude  = None
-        self._geo_sep   = None
-        self._num_sats  = 0
-        self._gps_qual  = None
-        self._speed     = 0.0
-        self._pdop      = 0
-        self._hdop      = 0
-        self._vdop      = 0
+        self._loop_enabled = False
+        self._loop_thread  = None
+        self._polled_data   = None # the data dict used by the last poll
+        self._polled_result = False
+        self._snapshot  = GPSSnapshot() # the current fix
+        self._history   = deque(maxlen=GPS._HISTORY_SIZE) # the most recent fixes, oldest first
         self._verbose   = False
+        self._as_json   = False
+        self._backoff   = GPS._MIN_BACKOFF_SEC
+        self._backoff_until = 0.0 # the bus is not read before this time
         self._log.info('ready.')
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def set_verbose(self, verbose):
+    def set_verbose(self, verbose, as_json=False):
+        '''
+        Enables or disables logging of each fix. If as_json is True each fix
+        is logged as a single line of compact JSON, suitable for a structured
+        log sink or later replay, rather than as the multi-line report.
+        '''
         self._verbose = verbose
+        self._as_json = as_json
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    @property
+    def loop_is_running(self):
+        '''
+        Returns true if the background reader thread is alive.
+        '''
+        return ( self._loop_enabled and self._loop_thread != None and self._loop_thread.is_alive() )
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def start(self):
+        '''
+        Starts a background thread that continually reads the GPS sensor,
+        so that poll() returns the most recent fix without blocking on the
+        I²C transaction and NMEA parse.
+        '''
+        if not self._enabled:
+            self._log.warning('cannot start: GPS disabled.')
+        elif self.loop_is_running:
+            self._log.warning('loop already running.')
+        else:
+            self._loop_enabled = True
+            self._loop_thread = Thread(name='gps_loop', target=GPS._loop, args=[self, lambda: self._loop_enabled], daemon=True)
+            self._loop_thread.start()
+            self._log.info('loop started.')
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _loop(self, f_is_enabled):
+        '''
+        The reader loop. Each changed fix is processed here into a new
+        snapshot, published by a single reference assignment and appended
+        to the history, so consumers never see a partial update and can
+        read at their own cadence.
+        '''
+        try:
+            while f_is_enabled():
+                _result = self._update()
+                if _result:
+                    _data = self._gps.data
+                    if _data != self._polled_data: # only process a changed fix
+                        self._polled_data   = _data
+                        self._polled_result = self._read(True, _data)
+                elif _result is None: # backing off
+                    time.sleep(max(0.0, self._backoff_until - time.time()))
+        except Exception as e:
+            self._log.error('error in loop: {}\n{}'.format(e, traceback.format_exc()))
+        finally:
+            self._log.info('exited loop.')
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def stop(self):
+        '''
+        Stops the background reader thread.
+        '''
+        if self.loop_is_running:
+            self._loop_enabled = False
+            self._loop_thread  = None
+            self._log.info('loop stopped.')
+        else:
+            self._log.warning('loop not running.')
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     @property
@@ -96,57 +310,73 @@ class GPS(object):
         return self._enabled
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    @property
+    def snapshot(self):
+        '''
+        Returns the GPSSnapshot of the current fix.
+        '''
+        return self._snapshot
+
+    @property
+    def history(self):
+        '''
+        Returns a bounded deque of the most recent GPSSnapshots, oldest
+        first. The deque is appended to by the reader, so copy it (e.g.,
+        with list()) before iterating.
+        '''
+        return self._history
+
     @property
     def timestamp(self):
-        return self._timestamp
+        return self._snapshot.timestamp
 
     @property
     def latitude(self):
-        return self._latitude
+        return self._snapshot.latitude
 
     @property
     def longitude(self):
-        return self._longitude
+        return self._snapshot.longitude
 
     @property
     def latitude_direction(self):
-        return self._lat_dir
+        return self._snapshot.lat_dir
 
     @property
     def longitude_direction(self):
-        return self._lon_dir
+        return self._snapshot.lon_dir
 
     @property
     def altitude(self):
-        return self._altitude
+        return self._snapshot.altitude
 
     @property
     def geo_sep(self):
-        return self._geo_sep
+        return self._snapshot.geo_sep
 
     @property
     def number_of_satellites(self):
-        return self._num_sats
+        return self._snapshot.num_sats
 
     @property
     def gps_quality(self):
-        return self._gps_qual
+        return self._snapshot.gps_qual
 
     @property
     def speed_over_ground(self):
-        return self._speed
+        return self._snapshot.speed
 
     @property
     def pdop(self):
-        return self._pdop
+        return self._snapshot.pdop
 
     @property
     def hdop(self):
-        return self._hdop
+        return self._snapshot.hdop
 
     @property
     def vdop(self):
-        return self._vdop
+        return self._snapshot.vdop
 
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
@@ -154,63 +384,88 @@ class GPS(object):
         '''
         Polls the GPS sensor, populating the various values.
         If the poll fails this will zero or nullify all values.
+
+        If the background reader has been started this performs no work,
+        returning the result for the most recent fix it has processed;
+        otherwise the sensor is read synchronously.
         '''
         if not self._enabled:
             return False
-        _style = Style.DIM
-        result = self._gps.update()
+        if self.loop_is_running:
+            return self._polled_result
+        result = self._update()
+        if result is None:
+            return False # backing off after an I²C error, values unchanged
         _data = self._gps.data
+        if result and _data is not None and _data == self._polled_data:
+            return self._polled_result # no new fix since the last poll
+        self._polled_data   = _data
+        self._polled_result = self._read(result, _data)
+        return self._polled_result
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _update(self):
+        '''
+        Updates the driver, returning its result, or None if an I²C error
+        occurred. Following an error the bus is left alone for a backoff
+        period that doubles with each successive error (up to a maximum),
+        returning None until it has elapsed. A successful update resets it.
+        '''
+        if time.time() < self._backoff_until:
+            return None
+        try:
+            _result = self._gps.update()
+            self._backoff = GPS._MIN_BACKOFF_SEC
+            return _result
+        except OSError as ose:
+            self._log.warning('I²C error, backing off for {:.2f}s: {}'.format(self._backoff, ose))
+            self._backoff_until = time.time() + self._backoff
+            self._backoff = min(self._backoff * 2, GPS._MAX_BACKOFF_SEC)
+            return None
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _read(self, result, _data):
+        '''
+        Populates the snapshot from the data dict, returning True if it
+        contains a fix.
+        '''
         if result and (_data is not None):
-            self._timestamp = _data.get('timestamp')
-            _num_sats = _data.get('num_sats')
-            self._num_sats  = 0 if _num_sats is None else int(_num_sats)
-            if self._num_sats > 0:
-                _latitude  = _data.get('latitude')
-                self._latitude  = -1 if _latitude is None else float(_latitude)
-                _longitude = _data.get('longitude')
-                self._longitude = -1 if _longitude is None else float(_longitude)
-                self._lat_dir   = _data.get('lat_dir')
-                self._lon_dir   = _data.get('lon_dir')
-                _altitude  = _data.get('altitude')
-                self._altitude  = 0.0 if _altitude is None else float(_altitude)
-                self._geo_sep   = _data.get('geo_sep')
-                self._gps_qual  = float(_data.get('gps_qual'))
-                self._speed     = _data.get('speed_over_ground')
-                self._pdop      = _data.get('pdop')
-                self._hdop      = _data.get('hdop')
-                self._vdop      = _data.get('vdop')
-                if self._num_sats is not None and self._num_sats > 1:
-                    _style = Style.NORMAL
-                if self._verbose:
-                    self._log.info(_style + '''
-        Timestamp:   {timestamp}
-        Latitude:    {latitude:6.4f}
-        Longitude:   {longitude:6.4f}
-        Lat Dir:     {lat_dir}
-        Long Dir:    {lon_dir}
-        Altitude:    {altitude}
-        Geo Sep:     {geo_sep}
-        Satellites:  {num_sats}
-        Quality:     {gps_qual}
-        Speed:       {speed_over_ground}
-        Fix Type:    {mode_fix_type}
-        PDOP:        {pdop}
-        VDOP:        {vdop}
-        HDOP:        {hdop}'''.format(**_data))
+            # PA1010D.data always contains every key
+            ( _timestamp, _num_sats, _latitude, _longitude, _lat_dir, _lon_dir, _altitude,
+                    _geo_sep, _gps_qual, _speed, _pdop, _hdop, _vdop ) = GPS._FIX_FIELDS(_data)
+            _num_sats = 0 if _num_sats is None else int(_num_sats)
+            if _num_sats > 0:
+                self._snapshot = GPSSnapshot(
+                        _timestamp,
+                        -1 if _latitude is None else float(_latitude),
+                        -1 if _longitude is None else float(_longitude),
+                        GPS._DIRECTIONS.get(_lat_dir, _lat_dir),
+                        GPS._DIRECTIONS.get(_lon_dir, _lon_dir),
+                        0.0 if _altitude is None else float(_altitude),
+                        _geo_sep,
+                        _num_sats,
+                        0.0 if _gps_qual is None else float(_gps_qual),
+                        _speed,
+                        _pdop,
+                        _hdop,
+                        _vdop)
+                self._history.append(self._snapshot)
+                if self._verbose and self._log.is_enabled_for(Level.INFO):
+                    if self._as_json: # omitting the driver's private slots
+                        self._log.info(json.dumps({ k: v for k, v in _data.items() if k[0] != '_' }, default=str, separators=(',', ':')))
+                    else:
+                        _template = GPS._REPORT_NORMAL if _num_sats > 1 else GPS._REPORT_DIM
+                        self._log.info(_template % _data)
                 return True
             else:
+                _last = self._snapshot
+                self._snapshot = GPSSnapshot(_timestamp, _last.latitude, _last.longitude, _last.lat_dir, _last.lon_dir,
+                        _last.altitude, _last.geo_sep, 0, _last.gps_qual, _last.speed, _last.pdop, _last.hdop, _last.vdop)
                 self._log.info('no satellites found.')
                 return False
         else:
-            self._timestamp = 'na'
-            self._latitude  = 0.0
-            self._longitude = 0.0
-            self._lat_dir   = 'na'
-            self._lon_dir   = 'na'
-            self._altitude  = 0.0
-            self._geo_sep   = 0.0
-            self._num_sats  = 0
-            self._gps_qual  = 0.0
+            _last = self._snapshot
+            self._snapshot = GPSSnapshot('na', 0.0, 0.0, 'na', 'na', 0.0, 0.0, 0, 0.0, _last.speed, _last.pdop, _last.hdop, _last.vdop)
         return False
 
 #EOF
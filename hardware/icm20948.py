@@ -10,22 +10,26 @@
 # modified: 2024-05-27
 #
 
-import traceback
-import itertools
-import math, statistics
+import time, traceback
+import math, struct
+import numpy
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 from math import pi as π
-from collections import deque
 from datetime import datetime as dt
 from colorsys import hsv_to_rgb
 from colorama import init, Fore, Style
 init()
 
-from icm20948 import ICM20948
+from icm20948 import (ICM20948, ICM20948_ACCEL_XOUT_H, ICM20948_ACCEL_CONFIG, ICM20948_GYRO_CONFIG_1,
+        ICM20948_I2C_SLV0_ADDR, ICM20948_I2C_SLV0_REG, ICM20948_I2C_SLV0_CTRL, ICM20948_I2C_SLV0_DO,
+        AK09916_I2C_ADDR, AK09916_CNTL2, AK09916_ST1, AK09916_ST1_DRDY)
 from rgbmatrix5x5 import RGBMatrix5x5
 from matrix11x7 import Matrix11x7
 from matrix11x7.fonts import font3x5, font5x5, font5x7, font5x7smoothed
 
-from core.cardinal import Cardinal
 from core.convert import Convert
 from core.component import Component
 from core.logger import Logger, Level
@@ -41,6 +45,88 @@ IN_MAX  = 3.3      # maximum analog value from IO Expander
 OUT_MIN = -1.0 * π # minimum scaled output value
 OUT_MAX = π        # maximum scaled output value
 HALF_PI = π / 2.0
+TWO_PI  = 2.0 * π
+DEG_PER_RAD = 180.0 / π
+# the fully-saturated RGB color of each integer heading (as a hue)
+HEADING_RGB = tuple(tuple(int(c * 255.0) for c in hsv_to_rgb(_hue / 360.0, 1.0, 1.0)) for _hue in range(360))
+# the sine and cosine of each integer heading
+HEADING_SIN_COS = tuple(( math.sin(math.radians(_degrees)), math.cos(math.radians(_degrees)) ) for _degrees in range(360))
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+def _compute_heading_unrolled(mag, amin, amax, axis0, axis1, trim):
+    '''
+    Updates the calibration bounds from the magnetometer reading, returning
+    the heading as a tuple of degrees (as an int) and radians. The amin and
+    amax lists are modified in place.
+
+    With only three axes this is unrolled as plain scalar operations, which
+    as interpreted Python is several times faster than NumPy, whose per-call
+    dispatch overhead dominates for such small arrays.
+    '''
+    mx, my, mz = mag
+    # if our current reading (mag) is less than our stored minimum reading
+    # (amin), or greater than our stored maximum reading (amax), then save
+    # a new lowest or highest possible value for our calibration of each axis
+    if mx < amin[0]:
+        amin[0] = mx
+    elif mx > amax[0]:
+        amax[0] = mx
+    if my < amin[1]:
+        amin[1] = my
+    elif my > amax[1]:
+        amax[1] = my
+    if mz < amin[2]:
+        amin[2] = mz
+    elif mz > amax[2]:
+        amax[2] = mz
+    # calibrate values by removing any offset when compared to the lowest
+    # reading seen for each axis, then scale based on the range of values
+    # seen, creating a calibrated value between 0 and 1 representing the
+    # magnetic value (an axis with no range yet is left at zero), then shift
+    # magnetic values to between -0.5 and 0.5 to enable the trig to work
+    _range_x = amax[0] - amin[0]
+    _range_y = amax[1] - amin[1]
+    _range_z = amax[2] - amin[2]
+    _scaled = ( ( mx - amin[0] ) / _range_x - 0.5 if _range_x else -0.5,
+                ( my - amin[1] ) / _range_y - 0.5 if _range_y else -0.5,
+                ( mz - amin[2] ) / _range_z - 0.5 if _range_z else -0.5 )
+    # convert from Gauss values in the appropriate 2 axis to a heading
+    # in Radians using trig. Note this does not compensate for tilt.
+    # Then add potentiometer trim (in radians, ±1𝛑)
+    # then wrap into 0..2𝛑 (a full circle in radians) as trim may exceed ±𝛑
+    _radians = ( math.atan2(_scaled[axis0], _scaled[axis1]) + trim ) % TWO_PI
+    # convert heading from radians to degrees, rounded to nearest full degree
+    return int(_radians * DEG_PER_RAD + 0.5) % 360, _radians
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+def _compute_heading_loop(mag, amin, amax, axis0, axis1, trim):
+    '''
+    As _compute_heading_unrolled() but written as an explicit loop over
+    the three axes, the form that compiles best with Numba. The amin and
+    amax arguments are NumPy arrays. This uses the same math.atan2() and
+    strict floating point arithmetic, so that the heading is identical
+    whether or not Numba is installed.
+    '''
+    _scaled = numpy.empty(3)
+    for i in range(3):
+        if mag[i] < amin[i]:
+            amin[i] = mag[i]
+        if mag[i] > amax[i]:
+            amax[i] = mag[i]
+        _range = amax[i] - amin[i]
+        _scaled[i] = ( (mag[i] - amin[i]) / _range if _range != 0 else 0.0 ) - 0.5
+    _radians = ( math.atan2(_scaled[axis0], _scaled[axis1]) + trim ) % TWO_PI
+    return int(_radians * DEG_PER_RAD + 0.5) % 360, _radians
+
+# use the compiled kernel if Numba is installed, whose calibration bounds are arrays
+if njit:
+    _compute_heading = njit(cache=True)(_compute_heading_loop)
+    _calibration_bounds = lambda mag: numpy.array(mag, dtype=numpy.float64)
+    # compile (or load from the cache) for the argument types used, now rather than upon the first read
+    _compute_heading((0.0, 0.0, 0.0), _calibration_bounds((0.0, 0.0, 0.0)), _calibration_bounds((0.0, 0.0, 0.0)), 0, 1, 0.0)
+else:
+    _compute_heading = _compute_heading_unrolled
+    _calibration_bounds = list
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 class Icm20948(Component):
@@ -68,7 +154,6 @@ class Icm20948(Component):
             self._rgbmatrix5x5 = self._rgbmatrix.get_rgbmatrix(Orientation.PORT)
         else:
             self._rgbmatrix5x5 = None
-        self._counter = itertools.count()
         # configuration ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
         _cfg = config['mros'].get('hardware').get('icm20948')
         self._verbose            = _cfg.get('verbose')
@@ -98,9 +183,11 @@ class Icm20948(Component):
         self._low_brightness    = 0.15
         self._medium_brightness = 0.25
         self._high_brightness   = 0.45
+        self._glyph_cache = None
         if self._show_rgbmatrix11x7:
             self._matrix11x7 = Matrix11x7()
             self._matrix11x7.set_brightness(self._low_brightness)
+            self._glyph_cache = self._rasterise_headings()
         self._cardinal_tolerance = _cfg.get('cardinal_tolerance') # tolerance to cardinal points (in radians)
         self._log.info('cardinal tolerance: {:.8f}'.format(self._cardinal_tolerance))
         # general orientation ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
@@ -115,28 +202,39 @@ class Icm20948(Component):
         # queue for stability check stats ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
         self._stdev = 0.0
         self._queue_length = _cfg.get('queue_length') # also affects how fast mean catches up to data
-#       self._queue = deque(self._queue_length*[0], self._queue_length)
-        self._queue = deque([], self._queue_length)
-        self._stability_threshold = _cfg.get('stability_threshold')
+        self._queue = [0] * self._queue_length # a ring buffer of headings
+        self._queue_index = 0 # the next position written in the ring buffer
+        self._queue_count = 0 # the number of headings in the ring buffer
+        self._sum_sin = 0.0 # running sum of the sines of the queued headings
+        self._sum_cos = 0.0 # running sum of the cosines of the queued headings
+        self._stability_threshold = float(_cfg.get('stability_threshold'))
         # misc/variables ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
         self._heading_count = 0
         self._display_rate = 20 # display every 10th set of values
+        self._display_countdown = 1 # polls remaining until the next display (the first poll displays)
+        self._reset_displayed()
         self._poll_rate_hz = _cfg.get('poll_rate_hz')
+        self._rate = Rate(self._poll_rate_hz, Level.ERROR) # shared by calibrate() and scan()
+        # read the trim pot every nth poll, as it needn't be read at the full poll rate
+        self._trim_poll_divider = max(1, int(self._poll_rate_hz / _cfg.get('trim_poll_rate_hz')))
         self._radians = None
         self._amin = None
         self._amax = None
         self._pitch = 0.0
         self._roll  = 0.0
         self._heading = 0
-        self._formatted_heading = lambda: 'Heading: {:d}°'.format(self._heading)
+        self._formatted_heading_str = 'Heading: {:d}°'.format(self._heading) # updated only when the heading changes
+        self._formatted_heading = lambda: self._formatted_heading_str
         self._mean_heading = 0
         self._mean_heading_radians = None
-        self._accel = [0.0, 0.0, 0.0]
-        self._gyro =  [0.0, 0.0, 0.0]
+        self._accel = ( 0.0, 0.0, 0.0 )
+        self._gyro  = ( 0.0, 0.0, 0.0 )
         self._include_accel_gyro = _cfg.get('include_accel_gyro')
         self._is_calibrated = False
         # instantiate sensor class  ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
         self.__icm20948 = ICM20948(i2c_addr=_cfg.get('i2c_address'))
+        if self._include_accel_gyro:
+            self._accel_scale, self._gyro_scale = self._read_full_scales()
         self._log.info('ready.')
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
@@ -166,32 +264,18 @@ class Icm20948(Component):
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def is_cardinal_aligned(self, cardinal=None):
         '''
-        Returns True if the mean heading is aligned within a 3° tolerance to
-        the specified cardinal directory, or if the argument is None, any of
-        the four cardinal directions.
+        Returns True if the mean heading is aligned within the configured
+        tolerance to the specified cardinal direction, or if the argument is
+        None, any of the four cardinal directions.
         '''
         if self._mean_heading_radians is None:
             return False
         _angle = self._mean_heading_radians
-        _degrees = int(Convert.to_degrees(_angle))
         if cardinal is None:
-            print('angle: {:4.2f}r / {:d}°; cardinal: not provided'.format(_angle, _degrees))
-        else:
-            print('angle: {:4.2f}r / {:d}°; cardinal: {:4.2f}'.format(_angle, _degrees, cardinal.radians))
-        if (( cardinal is None or cardinal is Cardinal.NORTH )
-                    and math.isclose(_angle, Cardinal.NORTH.radians, abs_tol=self._cardinal_tolerance)):
-            return True
-        elif (( cardinal is None or cardinal is Cardinal.WEST )
-                    and math.isclose(_angle, Cardinal.WEST.radians, abs_tol=self._cardinal_tolerance)):
-            return True
-        elif (( cardinal is None or cardinal is Cardinal.SOUTH )
-                    and math.isclose(_angle, Cardinal.SOUTH.radians, abs_tol=self._cardinal_tolerance)):
-            return True
-        elif (( cardinal is None or cardinal is Cardinal.EAST )
-                    and math.isclose(_angle, Cardinal.EAST.radians, abs_tol=self._cardinal_tolerance)):
-            return True
-        else:
-            return False
+            # the four cardinal directions lie at multiples of π/2
+            _offset = _angle % HALF_PI
+            return _offset <= self._cardinal_tolerance or HALF_PI - _offset <= self._cardinal_tolerance
+        return abs((_angle - cardinal.radians + π) % TWO_PI - π) <= self._cardinal_tolerance
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def difference_from_cardinal(self, cardinal):
@@ -241,8 +325,9 @@ class Icm20948(Component):
         This may not be a valid value if the device is not calibrated.
         '''
         if self._amin is None or self._amax is None:
-            self._amin = list(self.__icm20948.read_magnetometer_data())
-            self._amax = list(self.__icm20948.read_magnetometer_data())
+            _mag = self.__icm20948.read_magnetometer_data()
+            self._amin = _calibration_bounds(_mag)
+            self._amax = _calibration_bounds(_mag)
         return self._read_heading(self._amin, self._amax)
 #       return self._heading
 
@@ -280,7 +365,7 @@ class Icm20948(Component):
     def mean_heading(self):
         '''
         Return the mean compass heading in degrees (as an int). This is the
-        mean value of the current queue, whose size and rate accumulated are
+        circular mean of the current queue, whose size and rate accumulated are
         set in configuration. Because this is calculated from the queue, if
         the queue is changing rapidly this returned value won't accurately
         reflect the mean. Depending on configuration this takes roughly 1
@@ -304,16 +389,16 @@ class Icm20948(Component):
     @property
     def standard_deviation(self):
         '''
-        Return the current value of the standard deviation of headings
-        calculated from the queue.
+        Return the current value of the circular standard deviation of
+        headings (in degrees) calculated from the queue.
         '''
-        return self._stdev
+        return self._queue_stdev()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     @property
     def accelerometer(self):
         '''
-        Return the IMU's accelerometer value as an x,y,z value.
+        Return the IMU's accelerometer value as an x,y,z tuple.
         If not enabled this returns zeros.
         '''
         return self._accel
@@ -322,7 +407,7 @@ class Icm20948(Component):
     @property
     def gyroscope(self):
         '''
-        Return the IMU's gyroscope value as an x,y,z value.
+        Return the IMU's gyroscope value as an x,y,z tuple.
         If not enabled this returns zeros.
         '''
         return self._gyro
@@ -342,13 +427,15 @@ class Icm20948(Component):
         '''
         _start_time = dt.now()
         self._heading_count = 0
-        _rate = Rate(self._poll_rate_hz, Level.ERROR)
+        _rate = self._rate
+        _rate.reset()
         _ranger = Ranger(0.0, 180.0, 0.0, 0.5)
-        _counter = itertools.count()
         _count = 0
         _limit = 1800 # 1 minute
-        self._amin = list(self.__icm20948.read_magnetometer_data())
-        self._amax = list(self.__icm20948.read_magnetometer_data())
+        _log_progress = self._log.is_enabled_for(Level.INFO)
+        _mag = self.__icm20948.read_magnetometer_data()
+        self._amin = _calibration_bounds(_mag)
+        self._amax = _calibration_bounds(_mag)
         if self._play_sound:
             self._player.play(Sound.CHATTER_2)
         self._log.info(Fore.WHITE + Style.BRIGHT + '\n\n    calibrate by rotating sensor through a horizontal 360° motion…\n')
@@ -357,26 +444,27 @@ class Icm20948(Component):
             self._rgbmatrix.enable()
             self._rgbmatrix.set_random_delay_sec(_ranger.convert(180.0)) # speeds up random display as stdev shrinks
         while True:
-            _count = next(_counter)
             if self.is_calibrated or _count > _limit:
                 break
             try:
-                _heading = self._read_heading(self._amin, self._amax)
-                r, g, b = [int(c * 255.0) for c in hsv_to_rgb(_heading / 360.0, 1.0, 1.0)]
-                if self.calibration_check(_heading):
+                self._ingest_sample()
+                if self._is_calibrated:
                     break
                 if self._rgbmatrix5x5 and _count % 10 == 0:
                     self._rgbmatrix.set_random_delay_sec(_ranger.convert(self._stdev)) # speeds up random display as stdev shrinks
-                    self._log.info(Fore.CYAN + '[{:d}] trying to calibrate… stdev: {:4.2f}; '.format(_count, self._stdev) + Style.DIM + '(calibrated? {}; over limit? {})'.format(
-                            self.is_calibrated, _count > _limit))
+                    if _log_progress:
+                        self._log.info(Fore.CYAN + '[{:d}] trying to calibrate… stdev: {:4.2f}; '.format(_count, self._stdev) + Style.DIM + '(calibrated? {}; over limit? {})'.format(
+                                self.is_calibrated, _count > _limit))
             except Exception as e:
                 self._log.error('{} encountered, exiting: {}\n{}'.format(type(e), e, traceback.format_exc()))
             _rate.wait()
+            _count += 1
 
         _elapsed_ms = round(( dt.now() - _start_time ).total_seconds() * 1000.0)
         if self._show_rgbmatrix5x5 and self._rgbmatrix5x5:
             self._rgbmatrix.set_display_type(DisplayType.DARK)
             self._rgbmatrix.disable()
+        self._reset_displayed()
         if self.is_calibrated:
             self._log.info(Fore.GREEN + 'IMU calibrated: elapsed: {:d}ms'.format(_elapsed_ms))
             if self._play_sound:
@@ -385,14 +473,87 @@ class Icm20948(Component):
             self._log.error('unable to calibrate IMU after elapsed: {:d}ms'.format(_elapsed_ms))
         return self.is_calibrated
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _rasterise_headings(self):
+        '''
+        Renders each of the 360 integer headings into the 11x7 matrix's
+        frame buffer once, returning a tuple of the resulting buffers so
+        that poll() need only swap in the buffer rather than rendering the
+        string's glyphs pixel by pixel on every display cycle.
+
+        Returns None if the matrix library doesn't expose its frame buffer
+        as a NumPy array, in which case poll() renders each time.
+        '''
+        _matrix = self._matrix11x7
+        _cache = []
+        for _heading in range(360):
+            _matrix.clear()
+            _matrix.write_string('{:>3}'.format(_heading), y=1, font=font3x5)
+            _buf = getattr(_matrix, 'buf', None)
+            if not isinstance(_buf, numpy.ndarray):
+                self._log.warning('matrix 11x7 frame buffer unavailable: headings will not be cached.')
+                return None
+            _cache.append(_buf.copy())
+        _matrix.clear()
+        return tuple(_cache)
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _reset_displayed(self):
+        '''
+        Forgets what is currently shown on the 5x5 and 11x7 matrix displays,
+        so that the next display cycle redraws them. poll() otherwise skips
+        redrawing a display whose content hasn't changed.
+        '''
+        self._displayed_rgbmatrix5x5 = None # (r, g, b, brightness)
+        self._displayed_matrix11x7   = None # (heading, calibrated)
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def clear_queue(self):
         '''
         Clears the statistic queue.
         '''
-        self._queue.clear()
-#       for _ in range(100): # ...by populating it with zeros.
-#           self._queue.append(0)
+        self._queue_index = 0
+        self._queue_count = 0
+        self._sum_sin = 0.0
+        self._sum_cos = 0.0
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _push(self, heading):
+        '''
+        Adds a heading value (in integer degrees) to the queue, maintaining
+        the running sums of the sines and cosines of its contents so that the
+        statistics don't require iterating over the queue.
+
+        The queue is a fixed-size ring buffer, so once full each heading
+        overwrites the oldest in place.
+        '''
+        _index = self._queue_index
+        if self._queue_count == self._queue_length: # the oldest value is evicted
+            _sin, _cos = HEADING_SIN_COS[self._queue[_index]]
+            self._sum_sin -= _sin
+            self._sum_cos -= _cos
+        else:
+            self._queue_count += 1
+        heading %= 360
+        self._queue[_index] = heading
+        self._queue_index = ( _index + 1 ) % self._queue_length
+        _sin, _cos = HEADING_SIN_COS[heading]
+        self._sum_sin += _sin
+        self._sum_cos += _cos
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _queue_stdev(self):
+        '''
+        Returns the circular standard deviation of the queued headings in
+        degrees, or zero if the queue contains fewer than two values. Unlike
+        a linear standard deviation this is not inflated by headings either
+        side of north; for a small spread the two are nearly identical.
+        '''
+        _n = self._queue_count
+        if _n < 2:
+            return 0.0
+        _r = math.hypot(self._sum_sin, self._sum_cos) / _n # mean resultant length
+        return math.degrees(math.sqrt(-2.0 * math.log(_r))) if 0.0 < _r < 1.0 else 0.0
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def calibration_check(self, heading):
@@ -403,16 +564,30 @@ class Icm20948(Component):
 
         Note that this does not clear the queue.
         '''
-        self._queue.append(heading)
+        self._push(heading)
         self._heading_count += 1
-        if len(self._queue) < self._queue_length: # we only calibrate after the queue is full
+        if self._is_calibrated: # a one-way latch, so no need to check stability
+            return True
+        if self._queue_count < self._queue_length: # we only calibrate after the queue is full
             return False
-        self._stdev = statistics.stdev(self._queue)
+        self._stdev = self._queue_stdev()
 #       self._log.info('added heading of {:4.2f} to queue of {:d} values in queue with stdev of: {:5.3f}.'.format(heading, self._heading_count, self._stdev))
         if self._stdev < self._stability_threshold: # stable? then permanently flag as calibrated
             self.set_is_calibrated(True)
         return self._is_calibrated
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _ingest_sample(self):
+        '''
+        Reads the heading and adds it to the queue via calibration_check(),
+        returning the heading in degrees. This is the single per-sample
+        path shared by calibrate() and poll(); once calibrated (a one-way
+        latch) the stability check is skipped.
+        '''
+        _heading = self._read_heading(self._amin, self._amax)
+        self.calibration_check(_heading)
+        return _heading
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def scan(self, enabled=None, callback=None):
         '''
@@ -424,18 +599,30 @@ class Icm20948(Component):
 
         Note: calling this method will fail if not previously calibrated.
         '''
-        _rate = Rate(self._poll_rate_hz, Level.ERROR)
+        _rate = self._rate
+        _rate.reset()
         if self._amin is None or self._amax is None:
             raise Exception('compass not calibrated yet, call calibrate() first.')
+        # bind the per-loop attribute lookups to locals
+        _wait = _rate.wait
+        _poll = self.poll
+        _pot  = self._digital_pot
+        _adjust_trim = self._adjust_trim
+        _set_rgb = _pot.set_rgb if _adjust_trim and self._show_rgbmatrix5x5 else None
+        _trim_poll_divider = self._trim_poll_divider
+        _trim_countdown = 1 # polls remaining until the next read of the pot
         while enabled():
-            if self._adjust_trim:
-                self._trim = self._digital_pot.get_scaled_value(False)
-                if self._show_rgbmatrix5x5:
-                    self._digital_pot.set_rgb(self._digital_pot.value)
-            self.poll()
+            if _adjust_trim:
+                _trim_countdown -= 1
+                if _trim_countdown <= 0:
+                    _trim_countdown = _trim_poll_divider
+                    self._trim = _pot.get_scaled_value(False)
+                    if _set_rgb:
+                        _set_rgb(_pot.value)
+            _poll()
             if callback:
                 callback()
-            _rate.wait()
+            _wait()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def poll(self):
@@ -448,100 +635,141 @@ class Icm20948(Component):
         if not self.is_calibrated:
             raise Exception('IMU is not calibrated.')
         try:
-            self._heading = self._read_heading(self._amin, self._amax)
-            # add to queue to calculate mean heading
-            self._queue.append(self._heading)
-            self._stdev = statistics.stdev(self._queue)
-            if self._stdev < self._stability_threshold: # stable? then permanently flag as calibrated
-                self.set_is_calibrated(True)
-            self._mean_heading = statistics.mean(self._queue)
-            self._mean_heading_radians = math.radians(self._mean_heading)
-            if next(self._counter) % self._display_rate == 0: # display every 10th set of values
-                # convert to RGB
-                r, g, b = [int(c * 255.0) for c in hsv_to_rgb(self._heading / 360.0, 1.0, 1.0)]
-                if self._show_console:
+            _heading = self._ingest_sample()
+            if _heading != self._heading:
+                self._formatted_heading_str = 'Heading: {:d}°'.format(_heading)
+            self._heading = _heading
+            # the circular mean, correct either side of north
+            _mean_heading_radians = math.atan2(self._sum_sin, self._sum_cos) % TWO_PI
+            self._mean_heading_radians = _mean_heading_radians
+            self._mean_heading = int(round(DEG_PER_RAD * _mean_heading_radians)) % 360
+            self._display_countdown -= 1
+            if self._display_countdown <= 0: # display every 10th set of values
+                self._display_countdown = self._display_rate
+                _show_console = self._show_console and self._log.is_enabled_for(Level.INFO)
+                _show_rgbmatrix5x5 = self._show_rgbmatrix5x5 and self._rgbmatrix5x5
+                if _show_console or _show_rgbmatrix5x5:
+                    # convert to RGB
+                    r, g, b = HEADING_RGB[_heading % 360]
+                if _show_console:
                     if self._is_calibrated:
                         _style = Style.BRIGHT
                     else:
                         _style = Style.NORMAL
-                    self._log.info(_style + "heading: {:3d}° / mean: {:3d}°;".format(self._heading, int(self._mean_heading))
+                    self._log.info(_style + "heading: {:3d}° / mean: {:3d}°;".format(_heading, self._mean_heading)
                             + Style.NORMAL + " stdev: {:.2f}; trim: {:.2f}; color: #{:02X}{:02X}{:02X}".format(
-                                self._stdev, self._trim, r, g, b))
+                                self.standard_deviation, self._trim, r, g, b))
 #                   if self._include_accel_gyro:
 #                       self._log.info(Fore.WHITE + "accel: {:5.2f}, {:5.2f}, {:5.2f}; gyro: {:5.2f}, {:5.2f}, {:5.2f}".format(*self._accel, *self._gyro))
-                if self._show_rgbmatrix5x5 and self._rgbmatrix5x5:
+                if _show_rgbmatrix5x5:
                     if self._is_calibrated:
-                        RgbMatrix.set_all(self._rgbmatrix5x5, r, g, b)
-                        if self.is_cardinal_aligned():
-                            self._rgbmatrix5x5.set_brightness(0.8)
-                        else:
-                            self._rgbmatrix5x5.set_brightness(0.3)
+                        _displayed = ( r, g, b, 0.8 if self.is_cardinal_aligned() else 0.3 )
                     else:
-                        RgbMatrix.set_all(self._rgbmatrix5x5, 40, 40, 40)
-                    self._rgbmatrix5x5.show()
-                if self._show_rgbmatrix11x7:
-                    self._matrix11x7.clear()
-                    self._matrix11x7.write_string('{:>3}'.format(self._heading), y=1, font=font3x5)
-                    self._matrix11x7.show()
+                        _displayed = ( 40, 40, 40, None ) # brightness unchanged
+                    if _displayed != self._displayed_rgbmatrix5x5: # skip redrawing an unchanged display
+                        self._displayed_rgbmatrix5x5 = _displayed
+                        RgbMatrix.set_all(self._rgbmatrix5x5, *_displayed[:3], show=False)
+                        if _displayed[3] is not None:
+                            self._rgbmatrix5x5.set_brightness(_displayed[3])
+                        self._rgbmatrix5x5.show()
+                _displayed = ( _heading, self._is_calibrated )
+                if self._show_rgbmatrix11x7 and _displayed != self._displayed_matrix11x7:
+                    self._displayed_matrix11x7 = _displayed
+                    if self._glyph_cache:
+                        # never drawn into, so the cached buffer can be shared
+                        self._matrix11x7.buf = self._glyph_cache[_heading % 360]
+                    else:
+                        self._matrix11x7.clear()
+                        self._matrix11x7.write_string('{:>3}'.format(_heading), y=1, font=font3x5)
                     if self._is_calibrated:
                         self._matrix11x7.set_brightness(self._high_brightness)
 #                       self._matrix11x7.set_brightness(self._medium_brightness)
                     else:
                         self._matrix11x7.set_brightness(self._low_brightness)
+                    self._matrix11x7.show()
             # now get pitch and roll ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-            z, x, y = self.accelerometer # note Z,X,Y based on orientation of installed IMU
-            self._pitch = ( -180.0 * math.atan(x/math.sqrt(y*y + z*z)) / math.pi ) + self._pitch_trim
-            self._roll  = ( -180.0 * math.atan(y/math.sqrt(x*x + z*z)) / math.pi ) + self._roll_trim
-            return self._heading, self._pitch, self._roll
+            if self._include_accel_gyro:
+                _atan2 = math.atan2
+                _hypot = math.hypot
+                z, x, y = self._accel # note Z,X,Y based on orientation of installed IMU
+                self._pitch = -DEG_PER_RAD * _atan2(x, _hypot(y, z)) + self._pitch_trim
+                self._roll  = -DEG_PER_RAD * _atan2(y, _hypot(x, z)) + self._roll_trim
+            return _heading, self._pitch, self._roll
         except Exception as e:
             self._log.error('{} encountered, exiting: {}\n{}'.format(type(e), e, traceback.format_exc()))
             return None
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _read_full_scales(self):
+        '''
+        Returns the accelerometer (LSB/g) and gyroscope (LSB/dps) scale
+        divisors for the configured full scale ranges. The ICM20948 library
+        re-reads these registers (in a different register bank) on every
+        read_accelerometer_gyro_data() call; as they don't change unless set
+        they are read once here.
+        '''
+        _icm = self.__icm20948
+        _icm.bank(2)
+        # scale ranges from sections 3.1 and 3.2 of the datasheet
+        _accel_scale = ( 16384.0, 8192.0, 4096.0, 2048.0 )[(_icm.read(ICM20948_ACCEL_CONFIG) & 0x06) >> 1]
+        _gyro_scale  = ( 131.0, 65.5, 32.8, 16.4 )[(_icm.read(ICM20948_GYRO_CONFIG_1) & 0x06) >> 1]
+        _icm.bank(0)
+        return _accel_scale, _gyro_scale
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _read_all(self, timeout=1.0):
+        '''
+        Reads the magnetometer, accelerometer and gyroscope, populating the
+        accelerometer and gyroscope values and returning the magnetometer
+        x,y,z value (in uT).
+
+        This follows ICM20948.read_magnetometer_data(), but as the auxiliary
+        I²C master copies the AK09916 registers to those directly following
+        the accelerometer, gyroscope and temperature registers, all three are
+        obtained in a single block read. The AK09916 status (ST1) through ST2
+        registers are copied together, so the data-ready flag arrives with
+        the data, rather than polling magnetometer_ready() and then setting
+        up a second transfer (with its bank switches and 5ms trigger) for
+        the data itself.
+        '''
+        _icm = self.__icm20948
+        _icm.mag_write(AK09916_CNTL2, 0x01) # trigger single measurement
+        # as ICM20948.mag_read_bytes(AK09916_ST1, 9), without its block read
+        _icm.bank(3)
+        _icm.write(ICM20948_I2C_SLV0_CTRL, 0x80 | 0x08 | 9)
+        _icm.write(ICM20948_I2C_SLV0_ADDR, AK09916_I2C_ADDR | 0x80)
+        _icm.write(ICM20948_I2C_SLV0_REG, AK09916_ST1)
+        _icm.write(ICM20948_I2C_SLV0_DO, 0xff)
+        _icm.bank(0)
+        _start_time = time.time()
+        while True:
+            _icm.trigger_mag_io()
+            # accel & gyro (12 bytes, big-endian), temperature (2), ST1 (1), magnetometer (6, little-endian), TMPS, ST2
+            _data = bytes(_icm.read_bytes(ICM20948_ACCEL_XOUT_H, 23))
+            if _data[14] & AK09916_ST1_DRDY:
+                break
+            if time.time() - _start_time > timeout:
+                raise RuntimeError('Timeout waiting for Magnetometer Ready')
+            time.sleep(0.00001)
+        ax, ay, az, gx, gy, gz = struct.unpack_from('>hhhhhh', _data)
+        _accel_scale, _gyro_scale = self._accel_scale, self._gyro_scale
+        self._accel = ( ax / _accel_scale, ay / _accel_scale, az / _accel_scale )
+        self._gyro  = ( gx / _gyro_scale,  gy / _gyro_scale,  gz / _gyro_scale )
+        mx, my, mz = struct.unpack_from('<hhh', _data, 15)
+        # scale for magnetic flux density (uT), from section 3.3 of the datasheet
+        return mx * 0.15, my * 0.15, mz * 0.15
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _read_heading(self, amin, amax):
         '''
         Does the work of obtaining the heading value in degrees.
         '''
-        mag = list(self.__icm20948.read_magnetometer_data())
         if self._include_accel_gyro:
-            # ax, ay, az, gx, gy, gz
-            self._accel[0], self._accel[1], self._accel[2], self._gyro[0], self._gyro[1], self._gyro[2] = self.__icm20948.read_accelerometer_gyro_data()
-        for i in range(3):
-            v = mag[i]
-            # if our current reading (mag) is less than our stored minimum
-            # reading (amin), then save a new minimum reading, i.e., save a
-            # new lowest possible value for our calibration of this axis
-            if v < amin[i]:
-                amin[i] = v
-            # if our current reading (mag) is greater than our stored maximum
-            # reading (amax), then save a new maximum reading, i.e., save a
-            # new highest possible value for our calibration of this axis
-            if v > amax[i]:
-                amax[i] = v
-            # calibrate value by removing any offset when compared to the
-            # lowest reading seen for this axes
-            mag[i] -= amin[i]
-            # scale value based on the highest range of values seen for this
-            # axes. Creates a calibrated value between 0 and 1 representing
-            # magnetic value
-            try:
-                mag[i] /= amax[i] - amin[i]
-            except ZeroDivisionError:
-                pass
-            # Shift magnetic values to between -0.5 and 0.5 to enable the trig to work
-            mag[i] -= 0.5
-        # convert from Gauss values in the appropriate 2 axis to a heading
-        # in Radians using trig. Note this does not compensate for tilt.
-        self._radians = math.atan2(mag[self._axes[0]],mag[self._axes[1]])
-        # add potentiometer trim (in radians, ±1𝛑)
-        self._radians += self._trim
-         # if heading is negative, convert to positive, 2 x pi is a full circle in Radians
-        if self._radians < 0:
-            self._radians += 2 * math.pi
-#       _raw_radians = self._radians
-        # convert heading from radians to degrees
-        _degrees = math.degrees(self._radians)
-        # round heading to nearest full degree
-        return int(round(_degrees))
+            _mag = self._read_all()
+        else:
+            _mag = self.__icm20948.read_magnetometer_data()
+        _axis0, _axis1 = self._axes
+        _degrees, self._radians = _compute_heading(_mag, amin, amax, _axis0, _axis1, self._trim)
+        return _degrees
 
 #EOF
@@ -44,7 +44,7 @@ class IMU(Publisher):
         self._icm20948 = icm20948
         Publisher.__init__(self, IMU.CLASS_NAME, config, message_bus, message_factory, level=self._level)
         # configuration ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-        _cfg = config['mros'].get('publisher').get('imu')
+        _cfg = config['mros']['publisher']['imu']
         _loop_freq_hz         = _cfg.get('loop_freq_hz')
         self._publish_delay_sec = 1.0 / _loop_freq_hz
         self._pitch_threshold = _cfg.get('pitch_threshold')
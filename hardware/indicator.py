@@ -7,12 +7,13 @@
 #
 # author:   Murray Altheim
 # created:  2024-05-25
-# modified: 2024-05-25
+# modified: 2024-05-26
 #
 
 import sys, time, traceback
+import asyncio
 from threading import Thread
-from colorama import init, Fore, Style
+from colorama import init, Fore
 init()
 
 import ioexpander as io
@@ -23,7 +24,9 @@ from core.logger import Logger, Level
 # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
 class Indicator(Component):
     '''
-    A simple thread-based LED blinker that uses a pin on the IO Expander.
+    A simple LED blinker that uses a pin on the IO Expander. If provided
+    an asyncio event loop the blinking runs as a task on that loop,
+    otherwise it runs on its own thread.
 
     To be clear: the constructor argument is not a Raspberry Pi GPIO pin
     number, it is the pin on the IO Expander.
@@ -39,8 +42,11 @@ class Indicator(Component):
         self._ioe = io.IOE(i2c_addr=Indicator.IOE_I2C_ADDRESS)
         self._ioe.set_mode(self._pin, io.OUT)
         self._ioe.output(self._pin, io.LOW)
+        self._pin_state    = False
         self._loop_enabled = True
         self._loop_thread  = None
+        self._loop_task    = None # a concurrent Future for the blink task, if on an event loop
+        self._event_loop   = None
         self._log.info('ready.')
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
@@ -54,31 +60,53 @@ class Indicator(Component):
         Component.disable(self)
  
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def set(self, enable):
+    def set(self, enable, force=False):
         '''
-        Turns the LED on or off.
+        Turns the LED on or off. The last written state is cached so that
+        a call that wouldn't change the pin doesn't cost an I2C write,
+        unless 'force' is True.
         '''
-        if enable:
-            self._ioe.output(self._pin, io.HIGH)
-        else:
-            self._ioe.output(self._pin, io.LOW)
+        enable = bool(enable)
+        if enable == self._pin_state and not force:
+            return
+        self._pin_state = enable
+        self._ioe.output(self._pin, io.HIGH if enable else io.LOW)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     @property
     def loop_is_running(self):
         '''
-        Returns true if using an external clock or if the loop thread is alive.
+        Returns true if the blink task is pending or the loop thread is alive.
         '''
-        return ( self._loop_enabled and self._loop_thread != None and self._loop_thread.is_alive() )
+        if not self._loop_enabled:
+            return False
+        elif self._loop_task is not None:
+            return not self._loop_task.done()
+        return self._loop_thread != None and self._loop_thread.is_alive()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def blink(self, delay_sec):
+    def blink(self, delay_sec, loop=None):
         '''
         Blink the LED at the provided rate.
+
+        If an asyncio event loop is provided (e.g., the message bus loop)
+        the blink is scheduled as a task on it, so that its I2C writes
+        are serialised with the other tasks on that loop rather than
+        contending from a separate thread. Otherwise a thread is used.
+        The task is scheduled thread-safely, as the caller is generally
+        not running on the event loop's own thread.
+
+        :param delay_sec:  the time spent in each of the on and off states
+        :param loop:       the optional asyncio event loop
         '''
         self._log.info('start blinking…')
         if self.loop_is_running:
             self._log.warning('loop already running.')
+        elif loop is not None:
+            self._loop_enabled = True
+            self._event_loop = loop
+            self._loop_task = asyncio.run_coroutine_threadsafe(self._async_loop(delay_sec, lambda: self._loop_enabled), loop)
+            self._log.info('loop task created.')
         elif self._loop_thread is None:
             self._loop_enabled = True
             _is_daemon = False
@@ -88,19 +116,38 @@ class Indicator(Component):
         else:
             raise Exception('cannot enable loop: thread already exists.')
 
-   # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _blink_steps(self, delay_sec, f_is_enabled):
+        '''
+        A generator shared by the threaded and asyncio blink loops: each
+        step toggles the LED then yields the time to wait until the next
+        deadline, so that the I2C write time doesn't accumulate. If a step
+        overran its period this yields zero and resyncs rather than
+        bursting to catch up.
+        '''
+        _state  = True
+        _debug  = self._log.is_enabled_for(Level.DEBUG)
+        _next_t = time.monotonic()
+        while f_is_enabled():
+            if _debug:
+                self._log.debug(Fore.GREEN + 'ON' if _state else Fore.RED + 'OFF')
+            self.set(_state)
+            _state = not _state
+            _next_t += delay_sec
+            _dt = _next_t - time.monotonic()
+            if _dt <= 0:
+                _next_t = time.monotonic()
+                _dt = 0
+            yield _dt
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _loop(self, delay_sec, f_is_enabled):
         '''
         The blink loop.
         '''
         try:
-            while f_is_enabled():
-                print(Fore.GREEN + 'ON' + Style.RESET_ALL)
-                self.set(True)
-                time.sleep(delay_sec)
-                print(Fore.RED   + 'OFF' + Style.RESET_ALL)
-                self.set(False)
-                time.sleep(delay_sec)
+            for _dt in self._blink_steps(delay_sec, f_is_enabled):
+                time.sleep(_dt)
         except KeyboardInterrupt:
             self._log.info('Ctrl-C caught; exiting…')
         except Exception as e:
@@ -110,12 +157,34 @@ class Indicator(Component):
             self.close()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    async def _async_loop(self, delay_sec, f_is_enabled):
+        '''
+        The blink loop as an asyncio task. An overrun still awaits a zero
+        sleep, so the other tasks on the loop get to run.
+        '''
+        try:
+            for _dt in self._blink_steps(delay_sec, f_is_enabled):
+                await asyncio.sleep(_dt)
+        except asyncio.CancelledError:
+            self._log.info('loop task cancelled.')
+        except Exception as e:
+            self._log.error('error in loop task: {}\n{}'.format(e, traceback.format_exc()))
+        finally:
+            self._log.info('exited loop task.')
+            self.set(False)
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _stop_loop(self):
         '''
         Stop the loop.
         '''
         if self.loop_is_running:
             self._loop_enabled = False
+            if self._loop_task is not None:
+                # cancel on the event loop's own thread
+                self._event_loop.call_soon_threadsafe(self._loop_task.cancel)
+                self._loop_task  = None
+                self._event_loop = None
             self._loop_thread  = None
             self._log.info('loop disabled.')
         else:
@@ -126,7 +195,7 @@ class Indicator(Component):
         '''
         Stop the loop if running, then close the Indicator.
         '''
-        self.set(False)
+        self.set(False, force=True)
         self._stop_loop()
         Component.close(self) # calls disable
 
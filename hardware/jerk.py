@@ -13,13 +13,42 @@
 #
 
 import sys
-from math import isclose
-from colorama import init, Fore, Style
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+from colorama import init, Fore
 init()
 
 from core.logger import Level, Logger
 from core.component import Component
 
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+def _limit_value(current_value, target_value, tolerance, jerk_rate_limit, minimum_output, maximum_output):
+    '''
+    The numeric core of JerkLimiter.limit(), returning the target value
+    if within the tolerance or a single jerk step of the current value,
+    otherwise the current value stepped towards the target by the jerk
+    rate limit, clipped to the minimum and maximum output.
+    '''
+    _diff = target_value - current_value
+    _abs_diff = -_diff if _diff < 0.0 else _diff
+    if _abs_diff > jerk_rate_limit and _abs_diff > tolerance:
+        # only allow the current value plus or minus the jerk limit
+        _value = current_value + ( jerk_rate_limit if _diff > 0.0 else -jerk_rate_limit )
+    else: # close to each other or within a single jerk step
+        _value = target_value
+    # clip within safe limits
+    if _value > maximum_output:
+        return maximum_output
+    elif _value < minimum_output:
+        return minimum_output
+    return _value
+
+# use the compiled kernel if Numba is installed (its signature compiles it upon import)
+if njit:
+    _limit_value = njit('f8(f8,f8,f8,f8,f8,f8)', cache=True)(_limit_value)
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 class JerkLimiter(Component):
     '''
@@ -49,7 +78,9 @@ class JerkLimiter(Component):
             raise ValueError('jerk tolerance must be expressed as a percentage value (0-100).')
         self._tolerance = ( _jerk_tolerance_pc / 100 ) * _maximum_output
         self._jerk_rate_limit = self._tolerance * 1.3 # defined as the tolerance
-        self._clip = lambda n: _minimum_output if n <= _minimum_output else _maximum_output if n >= _maximum_output else n
+        self._min_output = _minimum_output
+        self._max_output = _maximum_output
+        self._limit_count = 0 # the number of calls that limited the target value
         self._log.info('jerk limit: {:5.2f}; tolerance: {:5.2f}; minimum output: {:5.2f}; maximum output: {:5.2f}'.format(
                 self._jerk_rate_limit, self._tolerance, _minimum_output, _maximum_output))
         if not self.suppressed and self.enabled:
@@ -75,38 +106,41 @@ class JerkLimiter(Component):
         changes larger than the jerk value. If suppressed or disabled this 
         still returns the target value argument, clipped.
         '''
-        _value = target_value
-        if not self.enabled:
-            self._log.debug('disabled; returning target value {:+06.2f}.'.format(target_value))
-        elif self.suppressed:
-            self._log.debug('suppressed; returning target value {:+06.2f}.'.format(target_value))
-        else:
-            # math.isclose(3, 15, abs_tol=0.03 * 255) # 3% on a 0-255 scale
-            if isclose(current_value, target_value, abs_tol=self._tolerance): # if close to each other
-                self._log.info('limit current {:+06.2f} to target value {:+06.2f}.'.format(current_value, target_value))
-                pass
-            elif target_value > current_value: # increasing ┈┈┈┈┈┈┈┈┈┈
-                if not isclose(current_value, target_value, abs_tol=self._tolerance):
-                    # only allow the current value plus the jerk limit
-                    _value = current_value + self._jerk_rate_limit
-                    self._log.info('limit current {:+06.2f} -> target value {:+06.2f}: value: {:5.2f}'.format(current_value, target_value, _value))
-                else:
-                    self._log.info(Fore.BLACK + 'limit current {:+06.2f} -> target value {:+06.2f}.'.format(current_value, target_value))
-
-            else: # decreasing ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-                if abs(current_value - target_value) > self._jerk_rate_limit:
-                    # only allow the current value minus the jerk limit
-                    _value = current_value - self._jerk_rate_limit
-                    self._log.info('limit current {:+06.2f} -> target value {:+06.2f}: value: {:5.2f}'.format(current_value, target_value, _value))
-                else:
-                    self._log.info(Fore.BLACK + 'limit current {:+06.2f} -> target value {:+06.2f}.'.format(current_value, target_value))
-
-        # clip within save limits
-        _value = -1.0 * self._clip(-1.0 * _value) if _value < 0.0 else self._clip(_value)
-        self._log.debug(Style.DIM + 'limit current {:+06.2f} -> target value {:+06.2f}, returning '.format(current_value, target_value)
-                + Fore.YELLOW + Style.NORMAL + 'value: {:5.2f}'.format(_value))
+        if not self.enabled or self.suppressed:
+            _value = min(self._max_output, max(self._min_output, target_value))
+            if self._log.is_enabled_for(Level.DEBUG):
+                self._log.debug('{}; returning target value {:+06.2f}.'.format('disabled' if not self.enabled else 'suppressed', _value))
+            return _value
+        _value = _limit_value(current_value, target_value, self._tolerance, self._jerk_rate_limit, self._min_output, self._max_output)
+        # check the log level so that a message that would be discarded isn't formatted
+        if _value != target_value:
+            # log only every 64th limited value, as at the motor loop rate these are frequent
+            self._limit_count += 1
+            if self._limit_count & 0x3F == 0 and self._log.is_enabled_for(Level.INFO):
+                self._log.info('limit current {:+06.2f} -> target value {:+06.2f}: '.format(current_value, target_value)
+                        + Fore.YELLOW + 'value: {:5.2f}'.format(_value) + Fore.CYAN + ' ({:d} limited)'.format(self._limit_count))
+        elif self._log.is_enabled_for(Level.DEBUG):
+            self._log.debug('current {:+06.2f} -> target value {:+06.2f}: unlimited.'.format(current_value, target_value))
         return _value
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def limit_many(self, current_values, target_values):
+        '''
+        As limit() but for a set of motors sharing the same configuration,
+        whose current and target values are provided as sequences of equal
+        length, returning a list of the limited values. This replaces one
+        limit() call per motor with a single call, looking up the settings
+        once. Nothing is logged.
+        '''
+        _min_output = self._min_output
+        _max_output = self._max_output
+        if not self.enabled or self.suppressed:
+            return [ min(_max_output, max(_min_output, _target)) for _target in target_values ]
+        _tolerance = self._tolerance
+        _jerk_rate_limit = self._jerk_rate_limit
+        return [ _limit_value(_current, _target, _tolerance, _jerk_rate_limit, _min_output, _max_output)
+                for _current, _target in zip(current_values, target_values) ]
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def print_test_result(self, current_value, target_value):
         _result = self.limit(current_value, target_value)
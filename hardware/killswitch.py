@@ -11,6 +11,8 @@
 #
 
 from enum import Enum
+from queue import SimpleQueue
+import threading
 from colorama import init, Fore, Style
 init()
 
@@ -25,15 +27,22 @@ class KillSwitch(Component):
 
     Rather than any fancy message bus stuff we just set up a callback on the
     pin when enabled and just call a kill() method on KROS when triggered.
+    The callback only sets a flag and hands off to a daemon thread that
+    performs the shutdown, so that the GPIO library's callback thread is
+    released immediately.
 
     This should be closed upon completion so the Pi resources are freed up.
 
-    Lazily-imports and configures pigpio when the enabled.
+    Lazily-imports and configures lgpio when enabled, whose edge events are
+    delivered directly from the kernel's GPIO character device, falling back
+    to pigpio (via the pigpiod daemon) if lgpio is not installed.
 
     :param config:    the application configuration
     :param kros:      the KROS application
     :param level:     the loggin level
     '''
+    GLITCH_US = 5000 # default debounce period (microseconds) if not configured
+
     def __init__(self, config, kros, level):
         self._log = Logger('kill', level)
         Component.__init__(self, self._log, suppressed=False, enabled=True)
@@ -41,22 +50,91 @@ class KillSwitch(Component):
             raise ValueError('wrong type for config argument: {}'.format(type(config)))
         self._config = config['kros'].get('hardware').get('killswitch')
         self._pin       = self._config.get('pin')
+        self._glitch_us = self._config.get('glitch_us', KillSwitch.GLITCH_US) # edges must be stable this long to be reported
         self._kros      = kros
         self._pi        = None
+        self._lgpio     = None # the lgpio module, if used
+        self._chip      = None # the lgpio gpiochip handle
+        self._callback  = None # the lgpio or pigpio callback
         self._initd     = False
-        self._triggered = False
+        self._triggered = threading.Event() # set upon the first falling edge, until reset
+        self._triggers  = SimpleQueue() # hands each trigger to the shutdown thread
+        self._shutdown_thread = None
         self._log.info('ready.')
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _callback_method(self, gpio, level, tick):
-        if not self._triggered:
-            self._triggered = True
-            self._log.info('killswitch triggered on GPIO pin {}; logic level: {}; ticks: {}'.format(gpio, level, tick))
+        if not self._triggered.is_set():
+            self._triggered.set()
+            self._triggers.put(( gpio, level, tick ))
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _shutdown_loop(self):
+        '''
+        Waits for a trigger from the callback, then shuts down KROS. A None
+        trigger (from close()) ends the loop.
+        '''
+        while True:
+            _trigger = self._triggers.get()
+            if _trigger is None:
+                break
+            self._log.info('killswitch triggered on GPIO pin {}; logic level: {}; ticks: {}'.format(*_trigger))
             self._kros.shutdown()
 
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _lgpio_callback_method(self, chip, gpio, level, timestamp):
+        '''
+        Adapts the lgpio callback signature to that of pigpio.
+        '''
+        self._callback_method(gpio, level, timestamp)
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _enable_lgpio(self, lgpio):
+        '''
+        Claims the pin for falling edge alerts using lgpio.
+        '''
+        self._log.info('enabling killswitch using lgpio...')
+        self._lgpio = lgpio
+        self._chip = lgpio.gpiochip_open(0)
+        lgpio.gpio_claim_alert(self._chip, self._pin, lgpio.FALLING_EDGE, lgpio.SET_PULL_UP)
+        # debounce so that only a stable transition is reported, not each edge of the switch bounce
+        lgpio.gpio_set_debounce_micros(self._chip, self._pin, self._glitch_us)
+        self._callback = lgpio.callback(self._chip, self._pin, lgpio.FALLING_EDGE, self._lgpio_callback_method)
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _close_lgpio(self):
+        '''
+        Cancels any lgpio callback and closes the gpiochip, releasing the
+        pin's claim. Safe to call after a partially completed setup.
+        '''
+        if self._callback:
+            self._callback.cancel()
+            self._callback = None
+        if self._chip is not None:
+            try:
+                self._lgpio.gpiochip_close(self._chip)
+            except Exception as e:
+                self._log.warning('error closing gpiochip: {}'.format(e))
+            self._chip = None
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _enable_pigpio(self, pigpio):
+        '''
+        Establishes a falling edge callback using pigpio.
+        '''
+        self._log.info('enabling killswitch using pigpio...')
+        self._pi = pigpio.pi()
+        if not self._pi.connected:
+            raise Exception('unable to establish connection to Pi.')
+        self._pi.set_mode(gpio=self._pin, mode=pigpio.INPUT) # GPIO 12 as input
+        self._pi.set_pull_up_down(self._pin, pigpio.PUD_UP)
+        # debounce so that only a stable transition is reported, not each edge of the switch bounce
+        self._pi.set_glitch_filter(self._pin, self._glitch_us)
+        self._callback = self._pi.callback(self._pin, pigpio.FALLING_EDGE, self._callback_method)
+
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def reset(self):
-        self._triggered = False
+        self._triggered.clear()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def enable(self):
@@ -64,15 +142,25 @@ class KillSwitch(Component):
         if self.enabled:
             if not self._initd:
                 try:
-                    self._log.info('importing pigpio...')
-                    import pigpio
-                    # establish pigpio interrupts for kill switch
-                    self._log.info('enabling killswitch...')
-                    self._pi = pigpio.pi()
-                    if not self._pi.connected:
-                        raise Exception('unable to establish connection to Pi.')
-                    self._pi.set_mode(gpio=self._pin, mode=pigpio.INPUT) # GPIO 12 as input
-                    _cb1 = self._pi.callback(self._pin, pigpio.FALLING_EDGE, self._callback_method)
+                    try:
+                        self._log.info('importing lgpio...')
+                        import lgpio
+                    except ImportError:
+                        lgpio = None
+                    if lgpio:
+                        try:
+                            self._enable_lgpio(lgpio)
+                        except Exception as e:
+                            # e.g., pin busy, wrong gpiochip or permissions: release it and try pigpio
+                            self._log.warning('unable to configure lgpio: {}; falling back to pigpio...'.format(e))
+                            self._close_lgpio()
+                            lgpio = None
+                    if not lgpio:
+                        self._log.info('lgpio unavailable; importing pigpio...')
+                        import pigpio
+                        self._enable_pigpio(pigpio)
+                    self._shutdown_thread = threading.Thread(name='killswitch', target=self._shutdown_loop, daemon=True)
+                    self._shutdown_thread.start()
                     self._log.info('configured kill switch callback on pin {:d}.'.format(self._pin))
                 except Exception as e:
                     self._log.warning('no kill switch available: error during configuration: {}'.format(e))
@@ -83,8 +171,16 @@ class KillSwitch(Component):
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def close(self):
+        if self._chip is not None:
+            self._close_lgpio()
+        elif self._callback:
+            self._callback.cancel()
+            self._callback = None
         if self._pi:
             self._pi.stop()
+        if self._shutdown_thread:
+            self._triggers.put(None)
+            self._shutdown_thread = None
         Component.close(self)
         self._log.info('closed.')
 
@@ -10,9 +10,11 @@
 # modified: 2024-06-02
 #
 
-import sys, time, random
+import sys, time
+import numpy
 import importlib.util
-from threading import Thread
+from threading import Thread, Lock
+from queue import SimpleQueue
 from colorama import init, Fore, Style
 init(autoreset=True)
 
@@ -30,6 +32,12 @@ try:
 except ImportError:
     raise Exception('This script requires the matrix11x7 module\nInstall with: pip3 install --user matrix11x7')
 
+try:
+    from smbus2 import SMBus, i2c_msg
+    _SMBUS2_IMPORTED = True
+except ImportError:
+    _SMBUS2_IMPORTED = False # fall back to the driver's chunked block writes
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 class Matrices(object):
 
@@ -65,11 +73,20 @@ class Matrices(object):
         else:
             self._stbd_matrix = None
             self._log.warning('no starboard-side matrix available.')
-        if not self._port_matrix and not self._stbd_matrix:
+        # the available matrices, port first, so callers iterate without None checks
+        self._matrices = tuple(_matrix for _matrix in (self._port_matrix, self._stbd_matrix) if _matrix)
+        if not self._matrices:
             self._enabled = False
             self._log.warning('no matrix displays available.')
-        # define perentage to column converter
-        self._percent_to_column = Ranger(0, 100, 0, 21)
+        # define percentage to column lookup table, indexed by integer percent
+        _percent_to_column = Ranger(0, 100, 0, 21)
+        self._column_for_percent = tuple(_percent_to_column.convert(_pc) for _pc in range(101))
+        # wipes run one at a time on a single persistent worker thread
+        self._jobs = SimpleQueue()
+        self._wipe_generation = 0 # incremented to preempt a running wipe
+        self._frame_lock = Lock() # held while drawing a wipe frame or clearing
+        self._worker = Thread(name='matrices', target=self._run_jobs, daemon=True)
+        self._worker.start()
         # TEMP counter
         self._hw_i = -1
         self._hwdt = 1
@@ -83,10 +100,12 @@ class Matrices(object):
         four characters to be displayed across the two displays, allowing
         four-letter words (the best kind).
         '''
-        if self._port_matrix and port_text:
-            self._port_matrix._text(port_text, small_font, False)
-        if self._stbd_matrix and stbd_text:
-            self._stbd_matrix._text(stbd_text, small_font, False)
+        _port_matrix = self._port_matrix
+        _stbd_matrix = self._stbd_matrix
+        if _port_matrix and port_text:
+            _port_matrix._text(port_text, small_font, False)
+        if _stbd_matrix and stbd_text:
+            _stbd_matrix._text(stbd_text, small_font, False)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def get_matrix(self, orientation):
@@ -100,10 +119,8 @@ class Matrices(object):
         '''
         Set the brightness of each display to a value between 0.0 and 1.0.
         '''
-        if self._port_matrix:
-            self._port_matrix.set_brightness(brightness)
-        if self._stbd_matrix:
-            self._stbd_matrix.set_brightness(brightness)
+        for _matrix in self._matrices:
+            _matrix.set_brightness(brightness)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def on(self):
@@ -111,10 +128,8 @@ class Matrices(object):
         Turns the lights on, i.e., enables all LEDs in each matrix.
         '''
 #       self._log.debug('matrix on…')
-        if self._port_matrix:
-            self._port_matrix.on()
-        if self._stbd_matrix:
-            self._stbd_matrix.on()
+        for _matrix in self._matrices:
+            _matrix.on()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def vertical_gradient(self, rows):
@@ -125,18 +140,17 @@ class Matrices(object):
         :param rows:     determines the number of rows to be lit
         '''
 #       self._log.debug('vertical gradient…')
-        if self._port_matrix:
-            self._port_matrix.gradient(rows, -1)
-        if self._stbd_matrix:
-            self._stbd_matrix.gradient(rows, -1)
+        for _matrix in self._matrices:
+            _matrix.gradient(rows, -1)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def percent(self, value):
         '''
         Displays a vertical bar expressing a percentage between the pair of
-        matrix displays.
+        matrix displays. The value is truncated to an integer and clamped
+        to 0-100.
         '''
-        self.column(self._percent_to_column.convert(value))
+        self.column(self._column_for_percent[max(0, min(100, int(value)))])
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def column(self, col):
@@ -150,30 +164,34 @@ class Matrices(object):
         #self._port_matrix.clear()
 #       self._port_matrix.clear()
 #       self._stbd_matrix.clear()
+        _port_matrix = self._port_matrix
+        _stbd_matrix = self._stbd_matrix
         if col < 11:
 #           self._log.info(Fore.GREEN + 'displaying column {:d} on starboard matrix…'.format(col))
-            if self._port_matrix:
-                self._port_matrix.clear(False)
-            if self._stbd_matrix:
-                self._stbd_matrix.column(col, blank=True)
+            if _port_matrix:
+                _port_matrix.clear(False)
+            if _stbd_matrix:
+                _stbd_matrix.column(col, blank=True)
         else:
 #           self._log.info(Fore.RED   + 'displaying column {:d} on port matrix…'.format(col))
-            if self._stbd_matrix:
-                self._stbd_matrix.clear(False)
-            if self._port_matrix:
-                self._port_matrix.column(col-11, blank=True)
-        if self._stbd_matrix:
-            self._stbd_matrix.show()
-        if self._port_matrix:
-            self._port_matrix.show()
+            if _stbd_matrix:
+                _stbd_matrix.clear(False)
+            if _port_matrix:
+                _port_matrix.column(col-11, blank=True)
+        if _stbd_matrix:
+            _stbd_matrix.show()
+        if _port_matrix:
+            _port_matrix.show()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def snow(self):
+    def snow(self, count=1):
         '''
         Displays random dots on both displays.
+
+        :param count:   the number of dots added to each display per call
         '''
-        self._stbd_matrix.snow()
-        self._port_matrix.snow()
+        for _matrix in self._matrices:
+            _matrix.snow(count)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def horizontal_gradient(self, cols):
@@ -184,10 +202,8 @@ class Matrices(object):
         :param cols:     determines the number of columns to be lit
         '''
 #       self._log.debug('horizontal gradient…')
-        if self._port_matrix:
-            self._port_matrix.gradient(-1, cols)
-        if self._stbd_matrix:
-            self._stbd_matrix.gradient(-1, cols)
+        for _matrix in self._matrices:
+            _matrix.gradient(-1, cols)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def wipe(self, direction, enable, delay_secs):
@@ -198,20 +214,43 @@ class Matrices(object):
         When direction is UP or DOWN, sequentially enables or disables the
         rows as a horizontally-changing gradient, i.e., a vertical movement.
 
-        This creates a new thread.
+        The wipe is queued to the worker thread and this returns
+        immediately. A new wipe preempts any wipe still running, which
+        stops at its next frame.
 
         :param direction:    a value of LEFT, RIGHT, UP, or DOWN
         :param enable:       if true, enables (lightens) the displays; if false, disables (darkens)
         :param delay_secs:   the inter-row delay time in seconds
         '''
-        if direction is Matrices.LEFT or direction is Matrices.RIGHT:
-            self._thread = Thread(name='horiz-wipe', target=self._horizontal_wipe(direction, enable, delay_secs))
-            self._thread.start()
-        elif direction is Matrices.UP or direction is Matrices.DOWN:
-            self._thread = Thread(name='vert-wipe', target=self._vertical_wipe(direction, enable, delay_secs))
-            self._thread.start()
+        if direction is Matrices.LEFT or direction is Matrices.UP:
+            # raised here rather than on the wipe thread so the caller sees it
+            raise NotImplementedError()
+        elif direction is Matrices.RIGHT:
+            _wipe = self._horizontal_wipe
+        elif direction is Matrices.DOWN:
+            _wipe = self._vertical_wipe
         else:
             raise Exception('unrecognised parameter for direction: {}'.format(direction))
+        with self._frame_lock:
+            self._wipe_generation += 1
+            _generation = self._wipe_generation
+        self._jobs.put(( _wipe, ( direction, enable, delay_secs, _generation )))
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _run_jobs(self):
+        '''
+        The worker thread loop, running each queued (method, args) job in
+        turn. A None job ends the loop.
+        '''
+        while True:
+            _job = self._jobs.get()
+            if _job is None:
+                break
+            _method, _args = _job
+            try:
+                _method(*_args)
+            except Exception as e:
+                self._log.error('{} raised in matrix job: {}'.format(type(e), e))
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def horizontal_scroll(self):
@@ -223,13 +262,14 @@ class Matrices(object):
             self._hw_i      = 0
             self._hwdt = 1
 #       self._log.info(Fore.WHITE + 'matrix on col: {:d}; dt: {:d}.'.format(self._hw_i, self._hwdt))
-        self._port_matrix.gradient(-1, self._hw_i)
-        self._stbd_matrix.gradient(-1, self._hw_i)
+        for _matrix in self._matrices:
+            _matrix.gradient(-1, self._hw_i)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def _horizontal_wipe(self, direction, enable, delay_secs):
+    def _horizontal_wipe(self, direction, enable, delay_secs, generation):
         '''
-        Method called by thread.
+        Method called by the worker thread. This returns early once a later
+        wipe or clear_all() has advanced the wipe generation.
 
         Wipe LEFT is not yet implemented.
         '''
@@ -240,18 +280,34 @@ class Matrices(object):
 #           self._log.debug('matrix horizontal wipe left {}…'.format('on' if enable else 'off'))
             raise NotImplementedError()
 #       self._log.debug('configured matrix horizontal wipe left on r[0]: {:d}; r[1]: {:d}; r[2]: {:d}…'.format(r[0], r[1], r[2]))
+        _matrices = self._matrices
+        _value = 0.7 if enable else 0.0
+        _next_t = time.monotonic()
         for i in range(r[0], r[1], r[2]):
 #           self._log.debug('matrix at {:d}'.format(i))
-            if self._port_matrix:
-                self._port_matrix.gradient(-1, i)
-            if self._stbd_matrix:
-                self._stbd_matrix.gradient(-1, i)
-            time.sleep(delay_secs)
+            with self._frame_lock:
+                if generation != self._wipe_generation:
+                    return # preempted
+                if i == r[0]: # draw the first frame whole to set the starting state
+                    for _matrix in _matrices:
+                        _matrix.gradient(-1, i)
+                else: # thereafter only the column that changes is written
+                    _index = i - 1 if enable else i
+                    for _matrix in _matrices:
+                        _matrix._column(_index, _value)
+            # sleep only for the residual so the frame write time doesn't accumulate
+            _next_t += delay_secs
+            _dt = _next_t - time.monotonic()
+            if _dt > 0:
+                time.sleep(_dt)
+            else: # overran the period, resync rather than bursting to catch up
+                _next_t = time.monotonic()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def _vertical_wipe(self, direction, enable, delay_secs):
+    def _vertical_wipe(self, direction, enable, delay_secs, generation):
         '''
-        Method called by thread.
+        Method called by the worker thread. This returns early once a later
+        wipe or clear_all() has advanced the wipe generation.
 
         Wipe UP is not yet implemented.
         '''
@@ -261,33 +317,55 @@ class Matrices(object):
         else:
 #           self._log.info('matrix vertical wipe up {}…'.format('on' if enable else 'off'))
             raise NotImplementedError()
+        _matrices = self._matrices
+        _value = 0.7 if enable else 0.0
+        _next_t = time.monotonic()
         for i in range(r[0], r[1], r[2]):
 #           self._log.debug('matrix at {:d}'.format(i))
-            if self._port_matrix:
-                self._port_matrix.gradient(i, -1)
-            if self._stbd_matrix:
-                self._stbd_matrix.gradient(i, -1)
-            time.sleep(delay_secs)
+            with self._frame_lock:
+                if generation != self._wipe_generation:
+                    return # preempted
+                if i == r[0]: # draw the first frame whole to set the starting state
+                    for _matrix in _matrices:
+                        _matrix.gradient(i, -1)
+                else: # thereafter only the row that changes is written
+                    _index = i - 1 if enable else i
+                    for _matrix in _matrices:
+                        _matrix._row(_index, _value)
+            # sleep only for the residual so the frame write time doesn't accumulate
+            _next_t += delay_secs
+            _dt = _next_t - time.monotonic()
+            if _dt > 0:
+                time.sleep(_dt)
+            else: # overran the period, resync rather than bursting to catch up
+                _next_t = time.monotonic()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def show(self):
-        if self._port_matrix:
-            self._port_matrix.show()
-        if self._stbd_matrix:
-            self._stbd_matrix.show()
+        for _matrix in self._matrices:
+            _matrix.show()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def clear_all(self):
         '''
-        Turns the lights off and disables any running threads.
+        Turns the lights off and disables any running threads, including
+        stopping any wipe in progress.
         '''
 #       self._log.debug('clear all.')
-        if self._port_matrix:
-            self._port_matrix.disable()
-            self._port_matrix.clear()
-        if self._stbd_matrix:
-            self._stbd_matrix.disable()
-            self._stbd_matrix.clear()
+        # waits for any wipe frame being drawn, which then sees it is preempted
+        with self._frame_lock:
+            self._wipe_generation += 1
+            for _matrix in self._matrices:
+                _matrix.disable()
+                _matrix.clear()
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def close(self):
+        '''
+        Clears the displays and ends the worker thread.
+        '''
+        self.clear_all()
+        self._jobs.put(None)
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 class Matrix(object):
@@ -297,29 +375,55 @@ class Matrix(object):
 
     This provides a threaded text display, as well as using the matrix as a
     light source.
+
+    If smbus2 is available each frame is sent to the display as a single
+    I2C write rather than the driver's five SMBus block writes.
     '''
+    COLOR_OFFSET = 0x24 # first PWM register of an IS31FL3731 frame
+
     def __init__(self, orientation, level=Level.DEBUG):
         self._log = Logger("matrix", level)
         if orientation is Orientation.PORT:
-            self._matrix11x7 = Matrix11x7(i2c_address=0x77)
+            _i2c_address = 0x77
         elif orientation is Orientation.STBD:
-            self._matrix11x7 = Matrix11x7(i2c_address=0x75) # default
+            _i2c_address = 0x75 # default
         else:
             raise Exception('unexpected value for orientation.')
+        if _SMBUS2_IMPORTED:
+            self._matrix11x7 = Matrix11x7(i2c_dev=SMBus(1), i2c_address=_i2c_address)
+            self._enable_single_write(self._matrix11x7.display)
+        else:
+            self._matrix11x7 = Matrix11x7(i2c_address=_i2c_address)
         self._matrix11x7.set_brightness(0.4)
         self._orientation = orientation
         self._enabled = False # used only for Threaded processes
         self._screens = 0
         self._thread = None
+        self._dirty = True     # the buffer differs from what is displayed
+        self._gradient = None  # the (rows, cols) last shown by _matrix(), if nothing since
         self._log.info('ready.')
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def show(self):
-        self._matrix11x7.show()
+    def _enable_single_write(self, display):
+        '''
+        Replaces the IS31FL3731 driver's update_frame(), which writes the
+        144 pixel values as 32 byte SMBus blocks (each with its own start,
+        address and register byte), with a single i2c_rdwr message. The
+        chip auto-increments its register address, so one write starting
+        at COLOR_OFFSET fills the whole frame.
+        '''
+        _i2c     = display.i2c
+        _address = display.address
+        _header  = [ Matrix.COLOR_OFFSET ]
+        def _update_frame(frame):
+            display.set_bank(frame)
+            _i2c.i2c_rdwr(i2c_msg.write(_address, _header + display._buf[frame]))
+        display.update_frame = _update_frame
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def set_brightness(self, brightness):
         self._matrix11x7.set_brightness(brightness)
+        self._dirty = True
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def text(self, message, is_small_font, is_scrolling):
@@ -341,6 +445,7 @@ class Matrix(object):
                 self._matrix11x7.write_string(message, y=1, font=font3x5)
             else:
                 self._matrix11x7.write_string(message)
+            self._dirty = True
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _text(self, message, is_small_font, is_scrolling):
@@ -359,7 +464,7 @@ class Matrix(object):
         if is_scrolling:
             # scroll the buffer content
             while self._enabled:
-                self._matrix11x7.show()
+                self._show()
                 self._matrix11x7.scroll() # scrolls 1 position horizontally
                 _scroll += 1
                 if ( _scroll % _buf_width ) == 0:
@@ -367,7 +472,7 @@ class Matrix(object):
                     self._log.info('{:d} screens ({:d}); buffer width: {}.'.format(self._screens, _scroll, _buf_width))
                 time.sleep(0.1)
         else:
-            self._matrix11x7.show()
+            self._show()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def get_screens(self):
@@ -393,12 +498,8 @@ class Matrix(object):
         self._matrix11x7.set_brightness(1.0)
         if blank:
             self.clear(False)
-        x = col
-        rows = 7
-        for y in range(0, rows):
-            v = 0.7
-            self._matrix11x7.pixel(x, y, v)
-        self._matrix11x7.show()
+        self._matrix11x7.buf[col, :self._matrix11x7.height] = 0.7
+        self._show()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def on(self):
@@ -408,14 +509,15 @@ class Matrix(object):
         if not self._matrix11x7:
 #           self._log.debug('no matrix 11x7 display available.')
             return
+        # fill once at full value and fade by brightness alone: squaring
+        # preserves the previous curve, where pixel and brightness both ramped
+        self._matrix11x7.buf[:self._matrix11x7.width, :self._matrix11x7.height] = 1.0
         for b in Util.frange(0.0, 1.0, 0.005):
-            for x in range(0, self._matrix11x7.width):
-                for y in range(0, self._matrix11x7.height):
-                    self._matrix11x7.pixel(x, y, b)
-            self._matrix11x7.set_brightness(b)
-            self._matrix11x7.show()
+            self._matrix11x7.set_brightness(b * b)
+            self._show()
             time.sleep(0.0005)
         self._matrix11x7.set_brightness(1.0)
+        self._dirty = True
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def off(self):
@@ -425,14 +527,15 @@ class Matrix(object):
         if not self._matrix11x7:
 #           self._log.debug('no matrix 11x7 display available.')
             return
+        # fill once at full value and fade by brightness alone: squaring
+        # preserves the previous curve, where pixel and brightness both ramped
+        self._matrix11x7.buf[:self._matrix11x7.width, :self._matrix11x7.height] = 1.0
         for b in Util.frange(1.0, 0.0, -0.005):
-            for x in range(0, self._matrix11x7.width):
-                for y in range(0, self._matrix11x7.height):
-                    self._matrix11x7.pixel(x, y, b)
-            self._matrix11x7.set_brightness(b)
-            self._matrix11x7.show()
+            self._matrix11x7.set_brightness(b * b)
+            self._show()
             time.sleep(0.0005)
         self._matrix11x7.set_brightness(0.0)
+        self._dirty = True
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def gradient(self, rows, cols):
@@ -452,12 +555,38 @@ class Matrix(object):
         self._matrix(_rows, _cols)
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
-    def snow(self):
-        x = random.randrange(0, self._matrix11x7.width)
-        y = random.randrange(0, self._matrix11x7.height)
-        bright = random.random() / 2.0
-        self._matrix11x7.pixel(x, y, bright)
-        self._matrix11x7.show()
+    def _column(self, col, value):
+        '''
+        Set a single column of the LEDs to the value and show it, leaving
+        the rest of the display as it is. This is the incremental step of
+        a wipe, so it does nothing while the text thread is running.
+        '''
+        if not self._matrix11x7 or self._thread is not None:
+            return
+        self._matrix11x7.buf[col, :self._matrix11x7.height] = value
+        self._show()
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _row(self, row, value):
+        '''
+        Set a single row of the LEDs to the value and show it, leaving
+        the rest of the display as it is.
+        '''
+        if not self._matrix11x7 or self._thread is not None:
+            return
+        self._matrix11x7.buf[:self._matrix11x7.width, row] = value
+        self._show()
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def snow(self, count=1):
+        '''
+        Light 'count' randomly-chosen LEDs at random brightnesses up to
+        half, written to the buffer together and shown once.
+        '''
+        _xs = numpy.random.randint(0, self._matrix11x7.width, count)
+        _ys = numpy.random.randint(0, self._matrix11x7.height, count)
+        self._matrix11x7.buf[_xs, _ys] = numpy.random.random(count) / 2.0
+        self._show()
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def _matrix(self, rows, cols):
@@ -471,19 +600,34 @@ class Matrix(object):
         elif self._thread is not None:
             self._log.warning('cannot continue: text thread is currently running.')
             return
+        elif not self._dirty and self._gradient == ( rows, cols ):
+            return # already displayed, skip the frame
 #       self._log.debug('matrix display ({},{})'.format(rows, cols))
         self._enabled = True
         self._matrix11x7.set_brightness(1.0)
         self.clear(False)
-        for x in range(0, cols):
-            for y in range(0, rows):
-                v = 0.7
-                self._matrix11x7.pixel(x, y, v)
-        self._matrix11x7.show()
+        self._matrix11x7.buf[:cols, :rows] = 0.7
+        self._show()
+        self._gradient = ( rows, cols )
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def show(self):
+        '''
+        Show the buffer if it has changed since it was last shown.
+        '''
+        if self._dirty:
+            self._show()
+
+    # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def _show(self):
+        '''
+        Unconditionally show the buffer, after which it is clean. Anything
+        other than _matrix() showing a frame clears the record of the last
+        gradient drawn.
+        '''
         self._matrix11x7.show()
+        self._dirty = False
+        self._gradient = None
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def clear(self, show=True):
@@ -494,12 +638,11 @@ class Matrix(object):
 #           self._log.debug('no matrix 11x7 display available.')
             return
         self._matrix11x7.set_brightness(0.5)
-        for x in range(0, self._matrix11x7.width):
-            for y in range(0, self._matrix11x7.height):
-                v = 0.7
-                self._matrix11x7.pixel(x, y, 0.0)
+        self._matrix11x7.buf[:self._matrix11x7.width, :self._matrix11x7.height] = 0.0
         if show:
-            self._matrix11x7.show()
+            self._show()
+        else:
+            self._dirty = True
 
     # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
     def disable(self):
@@ -23,7 +23,7 @@ class RemoteControl(object):
 
     def __init__(self, config):
         self._log = Logger('remote', Level.INFO)
-        _cfg = config['mros'].get('publisher').get('remote')
+        _cfg = config['mros']['publisher']['remote']
         # pin assignments
         self._d0_pin         = _cfg.get('d0_pin')
         self._d1_pin         = _cfg.get('d1_pin')
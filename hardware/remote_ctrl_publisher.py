@@ -52,7 +52,7 @@ class RemoteControlPublisher(Publisher):
         self._counter = itertools.count()
         self._pi             = None
         self._timer          = None
-        _cfg = config['mros'].get('publisher').get('remote')
+        _cfg = config['mros']['publisher']['remote']
         _loop_freq_hz        = _cfg.get('loop_freq_hz')
         self._publish_delay_sec = 1.0 / _loop_freq_hz
         self._clear_delay_sec = _cfg.get('clear_delay_sec')
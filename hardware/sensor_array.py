@@ -78,7 +78,7 @@ class SensorArray(Publisher):
         if config is None:
             raise ValueError('no configuration provided.')
 #       self._queue_publisher = queue_publisher
-        _cfg = config['mros'].get('publisher').get('sensor_array')
+        _cfg = config['mros']['publisher']['sensor_array']
         self._fwd_i2c_address = _cfg.get('fwd_i2c_address')
         self._aft_i2c_address = _cfg.get('aft_i2c_address')
         # fwd IOE pins ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
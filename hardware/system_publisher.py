@@ -56,7 +56,7 @@ class SystemPublisher(Publisher):
         if system is None:
             raise ValueError('no system sensor provided.')
         self._system = system
-        _cfg = config['mros'].get('publisher').get('system')
+        _cfg = config['mros']['publisher']['system']
         # config ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
         self._publish_delay_sec = _cfg.get('publish_delay_sec')
         self._current_threshold = _cfg.get('current_threshold')